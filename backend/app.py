@@ -1,26 +1,79 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 from datetime import datetime
-from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import OperationalError
+from collections import defaultdict
 import os
-import uuid
+import hmac
 from config import Config
 from models import db, User, ThumbsRecord, Product, ExchangeRecord
+from serializers import load_user_names, serialize_thumbs_records, serialize_exchange_records
+from query_budget import query_budget, init_query_budget
+from pool_metrics import pool_metrics, init_pool_metrics
+from replicas import init_replicas, read_from_primary
+from sql_profiler import init_sql_profiler
+from metrics import request_metrics, init_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from idempotency import idempotent, commit_response
+from rate_limit import limiter, rate_limit, RateLimited, client_ip, posted_username, current_user_id
+from pagination import keyset_page
+from cache import AggregateCache, ResponseCache
+from leaderboard import Leaderboard, WINDOWS as LEADERBOARD_WINDOWS
+from search import keyword_condition, ranked_search
+import ledger
+import export
+import user_import
+from uploads import (
+    UPLOAD_FOLDER, UPLOAD_URL_PREFIX, ImageTooLarge, save_upload, check_image_size, generate_variants, variant_urls,
+    stat_upload, is_immutable
+)
+import mimetypes
+from passwords import hasher, PasswordHasherBusy
+from auth import (
+    init_auth, create_user_token, get_current_user, current_role, admin_required,
+    bump_token_version, remember_token_version
+)
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
 # 初始化扩展
 CORS(app)
+init_pool_metrics(app)
+init_replicas(app)
 db.init_app(app)
 jwt = JWTManager(app)
+init_auth(jwt)
+init_sql_profiler(app)
+init_query_budget(app)
+init_metrics(app)
+limiter.init_app(app)
+hasher.init_app(app)
+
+# 管理员仪表板统计缓存（写接口提交后原地调整）
+dashboard_cache = AggregateCache(ttl=app.config['DASHBOARD_CACHE_TTL'])
+
+# 商品目录响应缓存（商品或库存变更时整体作废）
+catalog_cache = ResponseCache(max_entries=app.config['CATALOG_CACHE_SIZE'], ttl=app.config['CATALOG_CACHE_TTL'])
+
+# 积分排行榜（发放大拇哥后原地更新）
+leaderboard = Leaderboard(ttl=app.config['LEADERBOARD_REFRESH'])
 
 # 创建上传目录
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# 大拇哥积分（单大拇哥=1分，双大拇哥=5分）
+THUMB_POINTS = {'single': 1, 'double': 5}
+
+# 批量发放单次最多条数
+MAX_BATCH_THUMBS = 1000
+
+# 发放原因最大长度（与 thumbs_records.reason 列一致）
+MAX_REASON_LENGTH = 255
+
 # 允许的文件扩展名
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
@@ -28,10 +81,38 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def cursor_page_response(query, model, cursor, per_page, serialize):
+    """游标分页响应，with_total=1 时附带总数"""
+    with_total = request.args.get('with_total', '').lower() in ('1', 'true')
+    try:
+        data = keyset_page(query, model, cursor, per_page, serialize, with_total=with_total)
+    except ValueError:
+        return jsonify({'code': 400, 'message': '分页游标无效'}), 400
+    
+    return jsonify({'code': 200, 'data': data})
+
+
+def is_lock_conflict(error):
+    """是否为死锁/锁等待超时/SQLite 库锁，这类错误可以提示客户端重试"""
+    code = error.orig.args[0] if error.orig is not None and error.orig.args else None
+    return code in (1205, 1213) or 'database is locked' in str(error.orig)
+
+
+def cached_json_response(entry):
+    """用缓存的响应体构造响应，带强 ETag；If-None-Match 匹配时返回 304"""
+    body, etag = entry
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
 # ==================== 文件上传 API ====================
 
 @app.route('/api/upload', methods=['POST'])
+@query_budget(1)
 @jwt_required()
+@rate_limit('RATE_LIMIT_UPLOAD_USER', current_user_id)
 def upload_file():
     """上传文件"""
     if 'file' not in request.files:
@@ -43,23 +124,29 @@ def upload_file():
         return jsonify({'code': 400, 'message': '没有选择文件'}), 400
     
     if file and allowed_file(file.filename):
-        # 生成唯一文件名
+        # 按内容哈希命名保存，相同图片只存一份
         ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"{uuid.uuid4().hex}.{ext}"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        filename, created = save_upload(file, ext)
         
-        # 保存文件
-        file.save(filepath)
+        # 生成缩略图（先校验尺寸，解压炸弹直接拒绝）
+        if created:
+            try:
+                check_image_size(filename, app.config['UPLOAD_MAX_IMAGE_PIXELS'])
+            except ImageTooLarge:
+                return jsonify({'code': 400, 'message': '图片尺寸过大'}), 400
+            generate_variants(filename, background=app.config['UPLOAD_VARIANTS_ASYNC'])
         
         # 返回文件URL
-        file_url = f"/api/uploads/{filename}"
+        file_url = f"{UPLOAD_URL_PREFIX}{filename}"
         
         return jsonify({
             'code': 200,
             'message': '上传成功',
             'data': {
                 'url': file_url,
-                'filename': filename
+                'filename': filename,
+                'variants': variant_urls(file_url),
+                'deduplicated': not created
             }
         })
     
@@ -67,14 +154,46 @@ def upload_file():
 
 
 @app.route('/api/uploads/<filename>')
+@query_budget(0)
 def get_upload_file(filename):
-    """获取上传的文件"""
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    """获取上传的文件
+
+    内容哈希/uuid 命名的文件带一年的 immutable 缓存头；If-None-Match 命中时直接 304，
+    不访问文件系统。支持 Range 请求；配置 UPLOAD_ACCEL_REDIRECT_PREFIX 后交给 nginx 发送文件。
+    """
+    path = safe_join(UPLOAD_FOLDER, filename)
+    info = stat_upload(path, filename) if path else None
+    if info is None:
+        return jsonify({'code': 404, 'message': '文件不存在'}), 404
+    
+    etag, last_modified, size = info
+    immutable = is_immutable(filename)
+    max_age = app.config['UPLOAD_MAX_AGE'] if immutable else app.config['UPLOAD_MUTABLE_MAX_AGE']
+    
+    accel_prefix = app.config['UPLOAD_ACCEL_REDIRECT_PREFIX']
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+    elif accel_prefix:
+        # nginx 内部跳转，由 nginx 处理 Range 和文件发送
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = accel_prefix + filename
+        response.set_etag(etag)
+    else:
+        response = send_file(path, conditional=True, etag=etag, last_modified=last_modified, max_age=max_age)
+    
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = immutable
+    return response
 
 
 # ==================== 认证相关 API ====================
 
 @app.route('/api/auth/login', methods=['POST'])
+@query_budget(3)
+@rate_limit('RATE_LIMIT_AUTH_IP', client_ip)
+@rate_limit('RATE_LIMIT_AUTH_USERNAME', posted_username)
 def login():
     """用户登录"""
     data = request.get_json()
@@ -88,7 +207,15 @@ def login():
     if not user or not user.check_password(password):
         return jsonify({'code': 401, 'message': '用户名或密码错误'}), 401
     
-    access_token = create_access_token(identity=user.id)
+    if not user.is_active:
+        return jsonify({'code': 403, 'message': '账号已停用'}), 403
+    
+    # 哈希参数调整过的老密码，借登录时的明文重新哈希
+    if user.password_needs_rehash():
+        user.set_password(password)
+        db.session.commit()
+    
+    access_token = create_user_token(user)
     return jsonify({
         'code': 200,
         'message': '登录成功',
@@ -100,11 +227,11 @@ def login():
 
 
 @app.route('/api/auth/info', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def get_user_info():
     """获取当前用户信息"""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = get_current_user()
     
     if not user:
         return jsonify({'code': 404, 'message': '用户不存在'}), 404
@@ -116,11 +243,12 @@ def get_user_info():
 
 
 @app.route('/api/auth/change-password', methods=['POST'])
+@query_budget(4)
 @jwt_required()
+@rate_limit('RATE_LIMIT_PASSWORD_USER', current_user_id)
 def change_password():
     """修改当前用户密码"""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = get_current_user()
     
     if not user:
         return jsonify({'code': 404, 'message': '用户不存在'}), 404
@@ -136,9 +264,11 @@ def change_password():
     if not user.check_password(old_password):
         return jsonify({'code': 400, 'message': '旧密码错误'}), 400
     
-    # 设置新密码
+    # 设置新密码，已签发的令牌随之失效
     user.set_password(new_password)
+    bump_token_version(user)
     db.session.commit()
+    remember_token_version(user)
     
     return jsonify({
         'code': 200,
@@ -147,6 +277,9 @@ def change_password():
 
 
 @app.route('/api/auth/register', methods=['POST'])
+@query_budget(3)
+@rate_limit('RATE_LIMIT_AUTH_IP', client_ip)
+@rate_limit('RATE_LIMIT_AUTH_USERNAME', posted_username)
 def register():
     """用户注册"""
     data = request.get_json()
@@ -177,6 +310,7 @@ def register():
     
     db.session.add(user)
     db.session.commit()
+    dashboard_cache.adjust('total_users', 1)
     
     return jsonify({
         'code': 200,
@@ -188,20 +322,23 @@ def register():
 # ==================== 用户管理 API ====================
 
 @app.route('/api/users', methods=['GET'])
+@query_budget(3)
 @jwt_required()
 def get_users():
     """获取用户列表"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
-    keyword = request.args.get('keyword', '')
+    keyword = request.args.get('keyword', '').strip()
     
     query = User.query
     if keyword:
-        query = query.filter(
-            db.or_(
-                User.username.like(f'%{keyword}%'),
-                User.real_name.like(f'%{keyword}%')
-            )
+        query = query.filter(keyword_condition([User.username, User.real_name], keyword))
+    
+    # 游标分页模式：?cursor= 开启，响应中返回 next_cursor
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        return cursor_page_response(
+            query, User, cursor, per_page, lambda users: [user.to_dict() for user in users]
         )
     
     pagination = query.order_by(User.created_at.desc()).paginate(
@@ -219,16 +356,38 @@ def get_users():
     })
 
 
-@app.route('/api/users', methods=['POST'])
+@app.route('/api/users/search', methods=['GET'])
+@query_budget(2)
 @jwt_required()
-def create_user():
-    """创建用户"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
+def search_users():
+    """用户联想搜索，按相关度返回前 N 条"""
+    keyword = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    role = request.args.get('role')
     
-    if current_user.role != 'admin':
-        return jsonify({'code': 403, 'message': '无权限操作'}), 403
+    if not keyword:
+        return jsonify({'code': 200, 'data': []})
+    
+    query = db.session.query(User.id, User.username, User.real_name, User.role)
+    if role:
+        query = query.filter(User.role == role)
+    
+    rows = ranked_search(query, [User.username, User.real_name], keyword, limit)
     
+    return jsonify({
+        'code': 200,
+        'data': [
+            {'id': row.id, 'username': row.username, 'real_name': row.real_name, 'role': row.role}
+            for row in rows
+        ]
+    })
+
+
+@app.route('/api/users', methods=['POST'])
+@query_budget(4)
+@admin_required()
+def create_user():
+    """创建用户"""
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
@@ -251,6 +410,8 @@ def create_user():
     
     db.session.add(user)
     db.session.commit()
+    if user.role == 'user':
+        dashboard_cache.adjust('total_users', 1)
     
     return jsonify({
         'code': 200,
@@ -259,15 +420,73 @@ def create_user():
     })
 
 
+@app.route('/api/users/import', methods=['POST'])
+@query_budget(8)
+@admin_required()
+def import_users():
+    """批量导入/同步用户名单（CSV 或 JSON 文件，也可直接提交 JSON）
+
+    语句数与名单人数无关（超过 USER_IMPORT_CHUNK_SIZE 时按块增加），更新按变更字段组合各执行一条。
+    """
+    if 'file' in request.files:
+        file = request.files['file']
+        options = request.form
+        fmt = options.get('format') or file.filename.rsplit('.', 1)[-1].lower()
+        content = file.read()
+    else:
+        options = request.get_json() or {}
+        fmt = 'json'
+        content = options.get('users')
+    
+    def flag(name):
+        return str(options.get(name, '')).lower() in ('1', 'true')
+    
+    try:
+        rows = user_import.parse_roster(content, fmt)
+    except user_import.RosterError as e:
+        return jsonify({'code': 400, 'message': str(e)}), 400
+    
+    dry_run = flag('dry_run')
+    plan = user_import.plan_import(
+        rows,
+        sync=flag('sync'),
+        deactivate_missing=flag('deactivate_missing'),
+        default_password=options.get('default_password')
+    )
+    report = user_import.import_report(plan, dry_run)
+    if dry_run:
+        return jsonify({'code': 200, 'message': '预览完成，未写入数据', 'data': report})
+    if plan['errors']:
+        return jsonify({
+            'code': 400,
+            'message': f"名单有{len(plan['errors'])}处错误，未导入任何用户",
+            'data': report
+        }), 400
+    
+    created = user_import.apply_import(plan, chunk_size=app.config['USER_IMPORT_CHUNK_SIZE'])
+    # 停用或重新启用的用户进出排行榜，统计也随之变化，整体失效
+    if plan['deactivate'] or any('is_active' in item['changes'] for item in plan['update']):
+        leaderboard.invalidate()
+        dashboard_cache.invalidate()
+    else:
+        dashboard_cache.adjust('total_users', created)
+    
+    return jsonify({
+        'code': 200,
+        'message': f"新建{len(report['created'])}人，更新{len(report['updated'])}人，停用{len(report['deactivated'])}人",
+        'data': report
+    })
+
+
 @app.route('/api/users/<int:user_id>', methods=['PUT'])
+@query_budget(4)
 @jwt_required()
 def update_user(user_id):
     """更新用户信息"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
     
     # 只能修改自己的信息或管理员可以修改所有人
-    if current_user.role != 'admin' and current_user_id != user_id:
+    if current_role() != 'admin' and current_user_id != user_id:
         return jsonify({'code': 403, 'message': '无权限操作'}), 403
     
     user = User.query.get(user_id)
@@ -282,10 +501,14 @@ def update_user(user_id):
         user.email = data['email']
     if 'phone' in data:
         user.phone = data['phone']
-    if 'password' in data and data['password']:
+    password_changed = 'password' in data and data['password']
+    if password_changed:
         user.set_password(data['password'])
+        bump_token_version(user)
     
     db.session.commit()
+    if password_changed:
+        remember_token_version(user)
     
     return jsonify({
         'code': 200,
@@ -295,16 +518,10 @@ def update_user(user_id):
 
 
 @app.route('/api/users/<int:user_id>/reset-password', methods=['POST'])
-@jwt_required()
+@query_budget(4)
+@admin_required()
 def reset_user_password(user_id):
     """管理员重置用户密码"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    # 只有管理员可以重置密码
-    if current_user.role != 'admin':
-        return jsonify({'code': 403, 'message': '无权限操作'}), 403
-    
     user = User.query.get(user_id)
     if not user:
         return jsonify({'code': 404, 'message': '用户不存在'}), 404
@@ -315,9 +532,11 @@ def reset_user_password(user_id):
     if not new_password:
         return jsonify({'code': 400, 'message': '新密码不能为空'}), 400
     
-    # 设置新密码
+    # 设置新密码，该用户已签发的令牌随之失效
     user.set_password(new_password)
+    bump_token_version(user)
     db.session.commit()
+    remember_token_version(user)
     
     return jsonify({
         'code': 200,
@@ -325,17 +544,51 @@ def reset_user_password(user_id):
     })
 
 
+@app.route('/api/users/<int:user_id>/balance', methods=['GET'])
+@query_budget(4)
+@jwt_required()
+def get_user_balance(user_id):
+    """按积分流水计算用户在某一时刻的积分（管理员或本人）"""
+    current_user_id = get_jwt_identity()
+    if current_role() != 'admin' and current_user_id != user_id:
+        return jsonify({'code': 403, 'message': '无权限操作'}), 403
+    
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'code': 404, 'message': '用户不存在'}), 404
+    
+    at = request.args.get('at')
+    if at:
+        try:
+            at = datetime.fromisoformat(at)
+        except ValueError:
+            return jsonify({'code': 400, 'message': '时间格式错误'}), 400
+    
+    balance = ledger.balance_at(user_id, at or None)
+    data = {
+        'user_id': user_id,
+        'at': at.strftime('%Y-%m-%d %H:%M:%S') if at else None,
+        'total_points': balance['total_points'],
+        'available_points': balance['available_points']
+    }
+    # 当前余额时顺带核对 users 表上的缓存
+    if not at:
+        data['consistent'] = (
+            user.total_points == balance['total_points'] and user.available_points == balance['available_points']
+        )
+    
+    return jsonify({'code': 200, 'data': data})
+
+
 # ==================== 大拇哥管理 API ====================
 
 @app.route('/api/thumbs', methods=['POST'])
-@jwt_required()
+@query_budget(13)
+@admin_required('只有管理员可以发放大拇哥')
+@idempotent
 def give_thumbs():
     """发放大拇哥"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    if current_user.role != 'admin':
-        return jsonify({'code': 403, 'message': '只有管理员可以发放大拇哥'}), 403
     
     data = request.get_json()
     user_id = data.get('user_id')
@@ -348,12 +601,15 @@ def give_thumbs():
     if thumb_type not in ['single', 'double']:
         return jsonify({'code': 400, 'message': '大拇哥类型错误'}), 400
     
+    if reason is not None and (not isinstance(reason, str) or len(reason) > MAX_REASON_LENGTH):
+        return jsonify({'code': 400, 'message': f'原因不能超过{MAX_REASON_LENGTH}个字符'}), 400
+    
     user = User.query.get(user_id)
     if not user:
         return jsonify({'code': 404, 'message': '用户不存在'}), 404
     
     # 计算积分（单大拇哥=1分，双大拇哥=5分）
-    points = 1 if thumb_type == 'single' else 5
+    points = THUMB_POINTS[thumb_type]
     
     # 创建记录
     record = ThumbsRecord(
@@ -364,21 +620,144 @@ def give_thumbs():
         given_by=current_user_id
     )
     
-    # 更新用户积分
-    user.total_points += points
-    user.available_points += points
+    # 更新用户积分和统计计数（SQL 表达式自增，避免并发覆盖）
+    user.total_points = User.total_points + points
+    user.available_points = User.available_points + points
+    if thumb_type == 'single':
+        user.single_thumbs = User.single_thumbs + 1
+    else:
+        user.double_thumbs = User.double_thumbs + 1
     
+    # 写入积分流水（需要先拿到记录 ID）
     db.session.add(record)
-    db.session.commit()
-    
-    return jsonify({
+    db.session.flush()
+    ledger.credit_thumbs(record)
+    response = commit_response(jsonify({
         'code': 200,
         'message': f'成功发放{"单" if thumb_type == "single" else "双"}大拇哥',
         'data': record.to_dict()
-    })
+    }))
+    dashboard_cache.adjust('total_thumbs', 1)
+    if user.role == 'user' and user.is_active:
+        leaderboard.record({user.id: points})
+    
+    return response
+
+
+@app.route('/api/thumbs/batch', methods=['POST'])
+@query_budget(12)
+@admin_required('只有管理员可以发放大拇哥')
+@idempotent
+def give_thumbs_batch():
+    """批量发放大拇哥
+
+    一次 IN 查询校验全部用户，批量插入记录和积分流水，用一条 UPDATE ... CASE 累加积分和计数，只提交一次。
+    无效条目不影响其他条目，逐条返回结果。
+    """
+    current_user_id = get_jwt_identity()
+    
+    data = request.get_json()
+    items = data.get('items')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'code': 400, 'message': '发放列表不能为空'}), 400
+    
+    if len(items) > MAX_BATCH_THUMBS:
+        return jsonify({'code': 400, 'message': f'单次最多发放{MAX_BATCH_THUMBS}条'}), 400
+    
+    results = []
+    candidates = []
+    for index, item in enumerate(items):
+        user_id = item.get('user_id') if isinstance(item, dict) else None
+        thumb_type = item.get('thumb_type') if isinstance(item, dict) else None
+        reason = item.get('reason', '') if isinstance(item, dict) else ''
+        # type() 而不是 isinstance()：bool 是 int 的子类，true 会被当成用户 1
+        if type(user_id) is not int or not thumb_type:
+            results.append({'index': index, 'user_id': user_id, 'success': False, 'message': '参数不完整'})
+        elif not isinstance(thumb_type, str) or thumb_type not in THUMB_POINTS:
+            results.append({'index': index, 'user_id': user_id, 'success': False, 'message': '大拇哥类型错误'})
+        elif reason is not None and (not isinstance(reason, str) or len(reason) > MAX_REASON_LENGTH):
+            results.append({'index': index, 'user_id': user_id, 'success': False, 'message': f'原因不能超过{MAX_REASON_LENGTH}个字符'})
+        else:
+            candidates.append((index, item))
+    
+    # 一次查询校验所有用户
+    user_ids = {item['user_id'] for _, item in candidates}
+    existing_ids = set()
+    ranked_ids = set()
+    if user_ids:
+        for user_id, role, is_active in db.session.query(User.id, User.role, User.is_active).filter(User.id.in_(user_ids)):
+            existing_ids.add(user_id)
+            if role == 'user' and is_active:
+                ranked_ids.add(user_id)
+    
+    rows = []
+    points_by_user = defaultdict(int)
+    singles_by_user = defaultdict(int)
+    doubles_by_user = defaultdict(int)
+    for index, item in candidates:
+        user_id = item['user_id']
+        thumb_type = item['thumb_type']
+        if user_id not in existing_ids:
+            results.append({'index': index, 'user_id': user_id, 'success': False, 'message': '用户不存在'})
+            continue
+        
+        points = THUMB_POINTS[thumb_type]
+        rows.append({
+            'user_id': user_id,
+            'thumb_type': thumb_type,
+            'points': points,
+            'reason': item.get('reason', ''),
+            'given_by': current_user_id
+        })
+        points_by_user[user_id] += points
+        if thumb_type == 'single':
+            singles_by_user[user_id] += 1
+        else:
+            doubles_by_user[user_id] += 1
+        results.append({'index': index, 'user_id': user_id, 'success': True})
+    
+    if rows:
+        last_record_id = db.session.query(db.func.max(ThumbsRecord.id)).scalar() or 0
+        db.session.execute(insert(ThumbsRecord), rows)
+        ledger.credit_thumbs_batch(after_id=last_record_id, given_by=current_user_id)
+        
+        # 按用户汇总后一条 UPDATE 完成积分和计数累加（空的 CASE 不是合法 SQL，没有条目时加 0）
+        def delta(values):
+            return case(values, value=User.id, else_=0) if values else 0
+        
+        points_delta = delta(points_by_user)
+        db.session.execute(
+            update(User)
+            .where(User.id.in_(points_by_user))
+            .values(
+                total_points=User.total_points + points_delta,
+                available_points=User.available_points + points_delta,
+                single_thumbs=User.single_thumbs + delta(singles_by_user),
+                double_thumbs=User.double_thumbs + delta(doubles_by_user)
+            )
+            .execution_options(synchronize_session=False)
+        )
+    
+    results.sort(key=lambda result: result['index'])
+    response = commit_response(jsonify({
+        'code': 200,
+        'message': f'成功发放{len(rows)}条，失败{len(items) - len(rows)}条',
+        'data': {
+            'success_count': len(rows),
+            'fail_count': len(items) - len(rows),
+            'results': results
+        }
+    }))
+    if rows:
+        dashboard_cache.adjust('total_thumbs', len(rows))
+        leaderboard.record({user_id: points for user_id, points in points_by_user.items() if user_id in ranked_ids})
+    
+    return response
 
 
 @app.route('/api/thumbs', methods=['GET'])
+@query_budget(4)
 @jwt_required()
 def get_thumbs_records():
     """获取大拇哥记录"""
@@ -390,6 +769,10 @@ def get_thumbs_records():
     if user_id:
         query = query.filter_by(user_id=user_id)
     
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        return cursor_page_response(query, ThumbsRecord, cursor, per_page, serialize_thumbs_records)
+    
     pagination = query.order_by(ThumbsRecord.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
@@ -397,7 +780,7 @@ def get_thumbs_records():
     return jsonify({
         'code': 200,
         'data': {
-            'list': [record.to_dict() for record in pagination.items],
+            'list': serialize_thumbs_records(pagination.items),
             'total': pagination.total,
             'page': page,
             'per_page': per_page
@@ -406,6 +789,7 @@ def get_thumbs_records():
 
 
 @app.route('/api/thumbs/stats', methods=['GET'])
+@query_budget(2)
 @jwt_required()
 def get_thumbs_stats():
     """获取大拇哥统计"""
@@ -419,9 +803,9 @@ def get_thumbs_stats():
     if not user:
         return jsonify({'code': 404, 'message': '用户不存在'}), 404
     
-    # 统计单双大拇哥数量
-    single_count = ThumbsRecord.query.filter_by(user_id=user_id, thumb_type='single').count()
-    double_count = ThumbsRecord.query.filter_by(user_id=user_id, thumb_type='double').count()
+    # 单双大拇哥数量直接取用户表上的计数
+    single_count = user.single_thumbs
+    double_count = user.double_thumbs
     
     return jsonify({
         'code': 200,
@@ -438,15 +822,55 @@ def get_thumbs_stats():
     })
 
 
+@app.route('/api/leaderboard', methods=['GET'])
+@query_budget(3)
+@read_from_primary
+@jwt_required()
+def get_leaderboard():
+    """积分排行榜：前 N 名和当前用户名次
+
+    window: all 总榜（按总积分）/ week 本周 / month 本月（按期间获得的大拇哥积分）
+    """
+    window = request.args.get('window', 'all')
+    if window not in LEADERBOARD_WINDOWS:
+        return jsonify({'code': 400, 'message': '排行榜类型错误'}), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    
+    since, top, (my_rank, my_points), ranked_count = leaderboard.snapshot(window, get_jwt_identity(), limit)
+    user_names = load_user_names(user_id for _, user_id, _ in top)
+    
+    return jsonify({
+        'code': 200,
+        'data': {
+            'window': window,
+            'since': since.strftime('%Y-%m-%d %H:%M:%S') if since else None,
+            'list': [
+                {'rank': rank, 'user_id': user_id, 'user_name': user_names.get(user_id), 'points': points}
+                for rank, user_id, points in top
+            ],
+            'me': {'rank': my_rank, 'points': my_points},
+            'ranked_count': ranked_count
+        }
+    })
+
+
 # ==================== 商品管理 API ====================
 
 @app.route('/api/products', methods=['GET'])
+@query_budget(2)
+@read_from_primary
 def get_products():
     """获取商品列表"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status')  # 'on_shelf' or 'off_shelf'
-    keyword = request.args.get('keyword', '')
+    keyword = request.args.get('keyword', '').strip()
+    
+    cache_key = ('list', status, keyword, page, per_page)
+    version = catalog_cache.version
+    entry = catalog_cache.get(cache_key)
+    if entry is not None:
+        return cached_json_response(entry)
     
     query = Product.query
     
@@ -456,13 +880,13 @@ def get_products():
     
     # 关键词搜索
     if keyword:
-        query = query.filter(Product.name.like(f'%{keyword}%'))
+        query = query.filter(keyword_condition([Product.name], keyword))
     
     pagination = query.order_by(Product.sort_order.asc(), Product.id.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    return jsonify({
+    body = jsonify({
         'code': 200,
         'data': {
             'list': [product.to_dict() for product in pagination.items],
@@ -470,32 +894,39 @@ def get_products():
             'page': page,
             'per_page': per_page
         }
-    })
+    }).get_data()
+    
+    return cached_json_response(catalog_cache.set(cache_key, body, version))
 
 
 @app.route('/api/products/<int:product_id>', methods=['GET'])
+@query_budget(1)
+@read_from_primary
 def get_product(product_id):
     """获取商品详情"""
+    cache_key = ('detail', product_id)
+    version = catalog_cache.version
+    entry = catalog_cache.get(cache_key)
+    if entry is not None:
+        return cached_json_response(entry)
+    
     product = Product.query.get(product_id)
     if not product:
         return jsonify({'code': 404, 'message': '商品不存在'}), 404
     
-    return jsonify({
+    body = jsonify({
         'code': 200,
         'data': product.to_dict()
-    })
+    }).get_data()
+    
+    return cached_json_response(catalog_cache.set(cache_key, body, version))
 
 
 @app.route('/api/products', methods=['POST'])
-@jwt_required()
+@query_budget(3)
+@admin_required()
 def create_product():
     """创建商品"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    if current_user.role != 'admin':
-        return jsonify({'code': 403, 'message': '无权限操作'}), 403
-    
     data = request.get_json()
     name = data.get('name')
     points_required = data.get('points_required')
@@ -515,6 +946,9 @@ def create_product():
     
     db.session.add(product)
     db.session.commit()
+    catalog_cache.bump()
+    if product.status == 'on_shelf':
+        dashboard_cache.adjust('total_products', 1)
     
     return jsonify({
         'code': 200,
@@ -524,20 +958,16 @@ def create_product():
 
 
 @app.route('/api/products/<int:product_id>', methods=['PUT'])
-@jwt_required()
+@query_budget(4)
+@admin_required()
 def update_product(product_id):
     """更新商品信息"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    if current_user.role != 'admin':
-        return jsonify({'code': 403, 'message': '无权限操作'}), 403
-    
     product = Product.query.get(product_id)
     if not product:
         return jsonify({'code': 404, 'message': '商品不存在'}), 404
     
     data = request.get_json()
+    old_status = product.status
     
     if 'name' in data:
         product.name = data['name']
@@ -555,6 +985,9 @@ def update_product(product_id):
         product.sort_order = data['sort_order']
     
     db.session.commit()
+    catalog_cache.bump()
+    if product.status != old_status:
+        dashboard_cache.adjust('total_products', 1 if product.status == 'on_shelf' else -1)
     
     return jsonify({
         'code': 200,
@@ -564,15 +997,10 @@ def update_product(product_id):
 
 
 @app.route('/api/products/<int:product_id>/toggle-status', methods=['POST'])
-@jwt_required()
+@query_budget(4)
+@admin_required()
 def toggle_product_status(product_id):
     """切换商品上下架状态"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    if current_user.role != 'admin':
-        return jsonify({'code': 403, 'message': '无权限操作'}), 403
-    
     product = Product.query.get(product_id)
     if not product:
         return jsonify({'code': 404, 'message': '商品不存在'}), 404
@@ -580,6 +1008,8 @@ def toggle_product_status(product_id):
     # 切换状态
     product.status = 'off_shelf' if product.status == 'on_shelf' else 'on_shelf'
     db.session.commit()
+    catalog_cache.bump()
+    dashboard_cache.adjust('total_products', 1 if product.status == 'on_shelf' else -1)
     
     return jsonify({
         'code': 200,
@@ -589,15 +1019,10 @@ def toggle_product_status(product_id):
 
 
 @app.route('/api/products/<int:product_id>', methods=['DELETE'])
-@jwt_required()
+@query_budget(5)
+@admin_required()
 def delete_product(product_id):
     """删除商品"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    if current_user.role != 'admin':
-        return jsonify({'code': 403, 'message': '无权限操作'}), 403
-    
     product = Product.query.get(product_id)
     if not product:
         return jsonify({'code': 404, 'message': '商品不存在'}), 404
@@ -606,8 +1031,12 @@ def delete_product(product_id):
     if ExchangeRecord.query.filter_by(product_id=product_id).first():
         return jsonify({'code': 400, 'message': '该商品有兑换记录，不能删除'}), 400
     
+    was_on_shelf = product.status == 'on_shelf'
     db.session.delete(product)
     db.session.commit()
+    catalog_cache.bump()
+    if was_on_shelf:
+        dashboard_cache.adjust('total_products', -1)
     
     return jsonify({
         'code': 200,
@@ -618,11 +1047,17 @@ def delete_product(product_id):
 # ==================== 兑换管理 API ====================
 
 @app.route('/api/exchanges', methods=['POST'])
+@query_budget(13)
 @jwt_required()
+@idempotent
+@rate_limit('RATE_LIMIT_EXCHANGE_USER', current_user_id)
 def create_exchange():
-    """创建兑换记录"""
+    """创建兑换记录
+
+    库存和积分都用带条件的单条 UPDATE 扣减（stock >= 数量、available_points >= 所需积分），
+    并发兑换同一商品或重复点击时不会超卖，也不会把积分扣成负数。
+    """
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
     
     data = request.get_json()
     product_id = data.get('product_id')
@@ -631,6 +1066,9 @@ def create_exchange():
     if not product_id:
         return jsonify({'code': 400, 'message': '商品ID不能为空'}), 400
     
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+        return jsonify({'code': 400, 'message': '兑换数量无效'}), 400
+    
     product = Product.query.get(product_id)
     if not product:
         return jsonify({'code': 404, 'message': '商品不存在'}), 404
@@ -642,39 +1080,67 @@ def create_exchange():
         return jsonify({'code': 400, 'message': '商品库存不足'}), 400
     
     points_needed = product.points_required * quantity
-    if user.available_points < points_needed:
-        return jsonify({'code': 400, 'message': '积分不足'}), 400
-    
-    # 创建兑换记录
-    record = ExchangeRecord(
-        user_id=current_user_id,
-        product_id=product_id,
-        product_name=product.name,
-        points_spent=points_needed,
-        quantity=quantity,
-        status='completed'
-    )
-    
-    # 扣除积分和库存
-    user.available_points -= points_needed
-    product.stock -= quantity
+    product_name = product.name
+    
+    try:
+        # 扣库存：商品仍在架、库存足够且价格未被修改时才成功（先锁商品行，再锁用户行）
+        stock_updated = Product.query.filter(
+            Product.id == product_id,
+            Product.status == 'on_shelf',
+            Product.points_required == product.points_required,
+            Product.stock >= quantity
+        ).update({Product.stock: Product.stock - quantity}, synchronize_session=False)
+        if not stock_updated:
+            db.session.rollback()
+            return jsonify({'code': 409, 'message': '商品库存不足或信息已变更，请刷新后重试'}), 409
+        
+        # 扣积分
+        points_updated = User.query.filter(
+            User.id == current_user_id,
+            User.available_points >= points_needed
+        ).update({
+            User.available_points: User.available_points - points_needed,
+            User.total_exchanges: User.total_exchanges + 1
+        }, synchronize_session=False)
+        if not points_updated:
+            db.session.rollback()
+            return jsonify({'code': 400, 'message': '积分不足'}), 400
+        
+        # 创建兑换记录
+        record = ExchangeRecord(
+            user_id=current_user_id,
+            product_id=product_id,
+            product_name=product_name,
+            points_spent=points_needed,
+            quantity=quantity,
+            status='completed'
+        )
+        db.session.add(record)
+        db.session.flush()
+        ledger.debit_exchange(record)
+        response = commit_response(jsonify({
+            'code': 200,
+            'message': '兑换成功',
+            'data': record.to_dict()
+        }))
+    except OperationalError as e:
+        db.session.rollback()
+        if is_lock_conflict(e):
+            return jsonify({'code': 409, 'message': '兑换人数较多，请稍后重试'}), 409
+        raise
     
-    db.session.add(record)
-    db.session.commit()
+    catalog_cache.bump()
+    dashboard_cache.adjust('total_exchanges', 1)
     
-    return jsonify({
-        'code': 200,
-        'message': '兑换成功',
-        'data': record.to_dict()
-    })
+    return response
 
 
 @app.route('/api/exchanges', methods=['GET'])
+@query_budget(4)
 @jwt_required()
 def get_exchanges():
     """获取兑换记录"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
     
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
@@ -684,7 +1150,7 @@ def get_exchanges():
     query = ExchangeRecord.query
     
     # 普通用户只能查看自己的记录
-    if current_user.role != 'admin':
+    if current_role() != 'admin':
         query = query.filter_by(user_id=current_user_id)
     elif user_id:
         query = query.filter_by(user_id=user_id)
@@ -692,6 +1158,10 @@ def get_exchanges():
     if status:
         query = query.filter_by(status=status)
     
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        return cursor_page_response(query, ExchangeRecord, cursor, per_page, serialize_exchange_records)
+    
     pagination = query.order_by(ExchangeRecord.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
@@ -699,7 +1169,7 @@ def get_exchanges():
     return jsonify({
         'code': 200,
         'data': {
-            'list': [record.to_dict() for record in pagination.items],
+            'list': serialize_exchange_records(pagination.items),
             'total': pagination.total,
             'page': page,
             'per_page': per_page
@@ -708,34 +1178,53 @@ def get_exchanges():
 
 
 @app.route('/api/exchanges/<int:record_id>/cancel', methods=['POST'])
+@query_budget(8)
 @jwt_required()
 def cancel_exchange(record_id):
     """取消兑换（退回积分和库存）"""
     current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
     
     record = ExchangeRecord.query.get(record_id)
     if not record:
         return jsonify({'code': 404, 'message': '兑换记录不存在'}), 404
     
     # 只有管理员或本人可以取消
-    if current_user.role != 'admin' and record.user_id != current_user_id:
+    if current_role() != 'admin' and record.user_id != current_user_id:
         return jsonify({'code': 403, 'message': '无权限操作'}), 403
     
     if record.status != 'completed':
         return jsonify({'code': 400, 'message': '只能取消已完成的兑换'}), 400
     
-    # 退回积分
-    user = User.query.get(record.user_id)
-    user.available_points += record.points_spent
-    
-    # 退回库存
-    product = Product.query.get(record.product_id)
-    if product:
-        product.stock += record.quantity
+    try:
+        # 条件更新状态，防止并发重复取消导致积分、库存多退
+        cancelled = ExchangeRecord.query.filter_by(id=record_id, status='completed').update(
+            {ExchangeRecord.status: 'cancelled'}, synchronize_session=False
+        )
+        if not cancelled:
+            db.session.rollback()
+            return jsonify({'code': 409, 'message': '该兑换已被取消'}), 409
+        
+        # 退回库存（与兑换相同，先商品后用户）
+        Product.query.filter_by(id=record.product_id).update(
+            {Product.stock: Product.stock + record.quantity}, synchronize_session=False
+        )
+        
+        # 退回积分
+        User.query.filter_by(id=record.user_id).update({
+            User.available_points: User.available_points + record.points_spent,
+            User.total_exchanges: User.total_exchanges - 1
+        }, synchronize_session=False)
+        
+        ledger.refund_exchange(record)
+        db.session.commit()
+    except OperationalError as e:
+        db.session.rollback()
+        if is_lock_conflict(e):
+            return jsonify({'code': 409, 'message': '操作冲突，请稍后重试'}), 409
+        raise
     
-    record.status = 'cancelled'
-    db.session.commit()
+    catalog_cache.bump()
+    dashboard_cache.adjust('total_exchanges', -1)
     
     return jsonify({
         'code': 200,
@@ -744,45 +1233,150 @@ def cancel_exchange(record_id):
     })
 
 
+# ==================== 数据导出 API ====================
+
+def export_response(name, statement, to_row, fields):
+    """以流式响应返回导出文件，format 取 csv（默认）或 ndjson"""
+    fmt = request.args.get('format', 'csv')
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    body = export.stream_export(statement, to_row, fields, fmt, app.config['EXPORT_BATCH_SIZE'])
+    response = Response(stream_with_context(body), content_type=export.EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # 让 nginx 边读边发，不要整份缓冲
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def export_filters():
+    """解析导出的公共筛选参数，返回 (user_id, start_at, end_at) 或错误响应"""
+    if request.args.get('format', 'csv') not in export.EXPORT_FORMATS:
+        return None, (jsonify({'code': 400, 'message': '导出格式只支持 csv 或 ndjson'}), 400)
+    try:
+        start_at, end_at = export.parse_date_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return None, (jsonify({'code': 400, 'message': '时间格式错误'}), 400)
+    return (request.args.get('user_id', type=int), start_at, end_at), None
+
+
+@app.route('/api/export/thumbs', methods=['GET'])
+@query_budget(2)
+@admin_required()
+def export_thumbs_records():
+    """导出大拇哥记录（仅管理员）"""
+    filters, error = export_filters()
+    if error:
+        return error
+    
+    return export_response(
+        'thumbs', export.thumbs_export_statement(*filters), export.thumbs_row, export.THUMBS_FIELDS
+    )
+
+
+@app.route('/api/export/exchanges', methods=['GET'])
+@query_budget(2)
+@admin_required()
+def export_exchange_records():
+    """导出兑换记录（仅管理员）"""
+    filters, error = export_filters()
+    if error:
+        return error
+    
+    status = request.args.get('status')
+    return export_response(
+        'exchanges', export.exchanges_export_statement(*filters, status=status), export.exchange_row, export.EXCHANGE_FIELDS
+    )
+
+
 # ==================== 统计 API ====================
 
 @app.route('/api/stats/dashboard', methods=['GET'])
+@query_budget(5)
+@read_from_primary
 @jwt_required()
 def get_dashboard_stats():
     """获取仪表板统计数据"""
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    if current_user.role == 'admin':
-        # 管理员看全局统计
-        total_users = User.query.filter_by(role='user').count()
-        total_thumbs = ThumbsRecord.query.count()
-        total_exchanges = ExchangeRecord.query.filter_by(status='completed').count()
-        total_products = Product.query.filter_by(status='on_shelf').count()
-        
+    if current_role() == 'admin':
+        # 管理员看全局统计（带缓存）
         return jsonify({
             'code': 200,
-            'data': {
-                'total_users': total_users,
-                'total_thumbs': total_thumbs,
-                'total_exchanges': total_exchanges,
-                'total_products': total_products
-            }
+            'data': dashboard_cache.get(load_dashboard_aggregates)
         })
     else:
         # 普通用户看个人统计
+        current_user = get_current_user()
         return jsonify({
             'code': 200,
             'data': {
                 'total_points': current_user.total_points,
                 'available_points': current_user.available_points,
                 'used_points': current_user.total_points - current_user.available_points,
-                'total_thumbs': ThumbsRecord.query.filter_by(user_id=current_user_id).count(),
-                'total_exchanges': ExchangeRecord.query.filter_by(user_id=current_user_id, status='completed').count()
+                'total_thumbs': current_user.single_thumbs + current_user.double_thumbs,
+                'total_exchanges': current_user.total_exchanges
             }
         })
 
 
+def load_dashboard_aggregates():
+    """统计管理员仪表板的全局数据"""
+    return {
+        'total_users': User.query.filter_by(role='user').count(),
+        'total_thumbs': ThumbsRecord.query.count(),
+        'total_exchanges': ExchangeRecord.query.filter_by(status='completed').count(),
+        'total_products': Product.query.filter_by(status='on_shelf').count()
+    }
+
+
+@app.route('/api/stats/password-hasher', methods=['GET'])
+@query_budget(1)
+@admin_required()
+def get_password_hasher_stats():
+    """获取密码哈希线程池状态（仅管理员）"""
+    return jsonify({
+        'code': 200,
+        'data': hasher.stats()
+    })
+
+
+@app.route('/api/stats/db-pool', methods=['GET'])
+@query_budget(1)
+@admin_required()
+def get_db_pool_stats():
+    """获取数据库连接池状态（仅管理员，reset=1 时读取后清零累计计数）"""
+    data = pool_metrics.stats()
+    if request.args.get('reset', '').lower() in ('1', 'true'):
+        pool_metrics.reset()
+    
+    return jsonify({
+        'code': 200,
+        'data': data
+    })
+
+
+@app.route('/api/stats/cache', methods=['GET'])
+@query_budget(1)
+@admin_required()
+def get_cache_stats():
+    """获取缓存命中统计（仅管理员）"""
+    return jsonify({
+        'code': 200,
+        'data': {
+            'dashboard': dashboard_cache.stats(),
+            'catalog': catalog_cache.stats()
+        }
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+@query_budget(0)
+def get_metrics():
+    """Prometheus 指标（不在 /api 下，Nginx 不对外转发；配置 METRICS_TOKEN 后需带 Bearer 令牌）"""
+    token = app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'code': 401, 'message': '未授权'}), 401
+    
+    return Response(request_metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 # ==================== 错误处理 ====================
 
 @app.errorhandler(404)
@@ -790,6 +1384,22 @@ def not_found(error):
     return jsonify({'code': 404, 'message': '资源不存在'}), 404
 
 
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    db.session.rollback()
+    response = jsonify({'code': 503, 'message': '登录人数较多，请稍后重试'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+@app.errorhandler(RateLimited)
+def rate_limited(error):
+    db.session.rollback()
+    response = jsonify({'code': 429, 'message': '请求过于频繁，请稍后再试'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
 @app.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
@@ -0,0 +1,394 @@
+"""ASGI 入口
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+访问量最大的只读接口（商品列表/详情、仪表板统计、大拇哥记录、兑换记录）在事件循环中用异步驱动查询，
+等待数据库时不占用线程；其余接口原样交给 Flask 应用，在 ASGI_SYNC_THREADS 个线程的线程池中并行运行。
+响应体与同步接口逐字节一致（同一个 JSON 编码器、同一份商品目录缓存和统计缓存）；
+令牌缺失、过期或已吊销等情况直接交给 Flask 处理，错误响应也保持一致。
+"""
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask_jwt_extended import decode_token
+from sqlalchemy import func, select
+from app import app as flask_app, catalog_cache, dashboard_cache
+from async_db import create_session_factory
+from auth import cached_token_version, store_token_version, is_token_revoked
+from metrics import request_metrics
+from rate_limit import limiter
+from models import User, ThumbsRecord, Product, ExchangeRecord
+from pagination import clamp_per_page, keyset_condition, keyset_order, split_page
+from search import keyword_condition
+
+logger = logging.getLogger(__name__)
+
+engine, Session = create_session_factory(flask_app.config)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """交给 Flask 的请求在线程池中并行处理
+    
+    asgiref 的 WsgiToAsgi 用 sync_to_async 的默认参数 thread_sensitive=True，
+    同一进程的所有同步请求都排队在同一个线程上执行，相当于单线程；这里改用独立线程池。
+    """
+    
+    def __init__(self, wsgi_application, max_workers):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wsgi')
+    
+    async def __call__(self, scope, receive, send):
+        instance = PooledWsgiToAsgiInstance(self.wsgi_application)
+        instance.executor = self.executor
+        await instance(scope, receive, send)
+
+
+class PooledWsgiToAsgiInstance(WsgiToAsgiInstance):
+    executor = None
+    
+    async def run_wsgi_app(self, body):
+        run = WsgiToAsgiInstance.run_wsgi_app.__wrapped__  # 去掉 @sync_to_async 的原函数
+        await sync_to_async(run, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+wsgi_app = PooledWsgiToAsgi(flask_app, flask_app.config['ASGI_SYNC_THREADS'])
+
+
+class Request:
+    """异步接口用到的请求信息"""
+    
+    def __init__(self, scope):
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        query = parse_qs(scope['query_string'].decode('latin-1'), keep_blank_values=True)
+        self.args = {key: values[0] for key, values in query.items()}
+        self.jwt = None
+    
+    def arg_int(self, name, default=None):
+        """与 request.args.get(name, default, type=int) 相同，无法转换时取默认值"""
+        try:
+            return int(self.args[name])
+        except (KeyError, ValueError):
+            return default
+
+
+class Response:
+    def __init__(self, body, status=200, headers=None):
+        self.body = body
+        self.status = status
+        self.headers = headers or {}
+
+
+class Delegate(Exception):
+    """交给 Flask 处理（如令牌无效时由 Flask 生成一致的错误响应）"""
+
+
+def json_response(data, status=200):
+    return Response(flask_app.json.response(data).get_data(), status)
+
+
+def cached_response(request, entry):
+    """与 cached_json_response 相同：带强 ETag，If-None-Match 命中时返回 304"""
+    body, etag = entry
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if_none_match = request.headers.get('if-none-match', '')
+    tags = {tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')}
+    if etag in tags or if_none_match.strip() == '*':
+        return Response(b'', 304, headers)
+    return Response(body, 200, headers)
+
+
+async def load_identity(request, session):
+    """校验令牌并返回用户 ID，与 @jwt_required 加令牌版本检查等价"""
+    authorization = request.headers.get('authorization', '')
+    if not authorization.startswith('Bearer '):
+        raise Delegate()
+    try:
+        with flask_app.app_context():
+            payload = decode_token(authorization[len('Bearer '):])
+    except Exception:
+        raise Delegate()
+    if payload.get('type') != 'access' or 'role' not in payload:
+        raise Delegate()
+    
+    user_id = payload[flask_app.config['JWT_IDENTITY_CLAIM']]
+    hit, version = cached_token_version(user_id)
+    if not hit:
+        version = await session.scalar(select(User.token_version).where(User.id == user_id))
+        version = (version or 0) if version is not None else None
+        store_token_version(user_id, version, flask_app.config['TOKEN_VERSION_TTL'])
+    if is_token_revoked(payload, version):
+        raise Delegate()
+    
+    request.jwt = payload
+    return user_id
+
+
+async def load_user_names(session, user_ids):
+    """与 serializers.load_user_names 相同"""
+    ids = {user_id for user_id in user_ids if user_id}
+    if not ids:
+        return {}
+    rows = await session.execute(select(User.id, User.real_name).where(User.id.in_(ids)))
+    return {user_id: real_name for user_id, real_name in rows}
+
+
+async def paginate(session, statement, request):
+    """与 Flask-SQLAlchemy 的 paginate(error_out=False) 相同，返回 (记录, 总数)"""
+    page = max(request.arg_int('page', 1), 1)
+    per_page = request.arg_int('per_page', 20)
+    if per_page < 1:
+        per_page = 20
+    
+    total = await session.scalar(select(func.count()).select_from(statement.order_by(None).subquery()))
+    items = (await session.scalars(statement.limit(per_page).offset((page - 1) * per_page))).all()
+    return items, total
+
+
+async def record_list(session, request, model, statement, serialize):
+    """记录列表：带 cursor 参数时游标分页，否则页码分页"""
+    page = request.arg_int('page', 1)
+    per_page = request.arg_int('per_page', 20)
+    
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        per_page = clamp_per_page(per_page)
+        try:
+            condition = keyset_condition(model, cursor) if cursor else None
+        except ValueError:
+            return json_response({'code': 400, 'message': '分页游标无效'}, 400)
+        total = None
+        if request.args.get('with_total', '').lower() in ('1', 'true'):
+            total = await session.scalar(select(func.count()).select_from(statement.subquery()))
+        if condition is not None:
+            statement = statement.where(condition)
+        items = (await session.scalars(statement.order_by(*keyset_order(model)).limit(per_page + 1))).all()
+        items, next_cursor = split_page(items, per_page)
+        return json_response({
+            'code': 200,
+            'data': {
+                'list': await serialize(session, items),
+                'next_cursor': next_cursor,
+                'total': total,
+                'per_page': per_page
+            }
+        })
+    
+    items, total = await paginate(session, statement.order_by(model.created_at.desc()), request)
+    return json_response({
+        'code': 200,
+        'data': {
+            'list': await serialize(session, items),
+            'total': total,
+            'page': page,
+            'per_page': per_page
+        }
+    })
+
+
+async def serialize_thumbs_records(session, records):
+    user_names = await load_user_names(
+        session, [record.user_id for record in records] + [record.given_by for record in records]
+    )
+    return [record.to_dict(user_names=user_names) for record in records]
+
+
+async def serialize_exchange_records(session, records):
+    user_names = await load_user_names(session, [record.user_id for record in records])
+    return [record.to_dict(user_names=user_names) for record in records]
+
+
+# ==================== 异步接口 ====================
+
+async def get_products(request, session):
+    """获取商品列表（GET /api/products）"""
+    page = request.arg_int('page', 1)
+    per_page = request.arg_int('per_page', 20)
+    status = request.args.get('status')
+    keyword = request.args.get('keyword', '').strip()
+    
+    cache_key = ('list', status, keyword, page, per_page)
+    version = catalog_cache.version
+    entry = catalog_cache.get(cache_key)
+    if entry is not None:
+        return cached_response(request, entry)
+    
+    statement = select(Product)
+    if status:
+        statement = statement.where(Product.status == status)
+    if keyword:
+        with flask_app.app_context():
+            statement = statement.where(keyword_condition([Product.name], keyword))
+    
+    items, total = await paginate(session, statement.order_by(Product.sort_order.asc(), Product.id.desc()), request)
+    body = json_response({
+        'code': 200,
+        'data': {
+            'list': [product.to_dict() for product in items],
+            'total': total,
+            'page': page,
+            'per_page': per_page
+        }
+    }).body
+    return cached_response(request, catalog_cache.set(cache_key, body, version))
+
+
+async def get_product(request, session, product_id):
+    """获取商品详情（GET /api/products/<id>）"""
+    cache_key = ('detail', product_id)
+    version = catalog_cache.version
+    entry = catalog_cache.get(cache_key)
+    if entry is not None:
+        return cached_response(request, entry)
+    
+    product = await session.get(Product, product_id)
+    if not product:
+        return json_response({'code': 404, 'message': '商品不存在'}, 404)
+    
+    body = json_response({'code': 200, 'data': product.to_dict()}).body
+    return cached_response(request, catalog_cache.set(cache_key, body, version))
+
+
+async def get_dashboard_stats(request, session):
+    """获取仪表板统计（GET /api/stats/dashboard）"""
+    user_id = await load_identity(request, session)
+    if request.jwt['role'] == 'admin':
+        data, generation = dashboard_cache.lookup()
+        if data is None:
+            data = {
+                'total_users': await count(session, User, User.role == 'user'),
+                'total_thumbs': await count(session, ThumbsRecord),
+                'total_exchanges': await count(session, ExchangeRecord, ExchangeRecord.status == 'completed'),
+                'total_products': await count(session, Product, Product.status == 'on_shelf')
+            }
+            dashboard_cache.store(data, generation)
+        return json_response({'code': 200, 'data': data})
+    
+    user = await session.get(User, user_id)
+    return json_response({
+        'code': 200,
+        'data': {
+            'total_points': user.total_points,
+            'available_points': user.available_points,
+            'used_points': user.total_points - user.available_points,
+            'total_thumbs': user.single_thumbs + user.double_thumbs,
+            'total_exchanges': user.total_exchanges
+        }
+    })
+
+
+async def count(session, model, *conditions):
+    return await session.scalar(select(func.count()).select_from(model).where(*conditions))
+
+
+async def get_thumbs_records(request, session):
+    """获取大拇哥记录（GET /api/thumbs）"""
+    await load_identity(request, session)
+    statement = select(ThumbsRecord)
+    user_id = request.arg_int('user_id')
+    if user_id:
+        statement = statement.where(ThumbsRecord.user_id == user_id)
+    return await record_list(session, request, ThumbsRecord, statement, serialize_thumbs_records)
+
+
+async def get_exchanges(request, session):
+    """获取兑换记录（GET /api/exchanges），普通用户只能查看自己的记录"""
+    current_user_id = await load_identity(request, session)
+    statement = select(ExchangeRecord)
+    user_id = request.arg_int('user_id')
+    if request.jwt['role'] != 'admin':
+        statement = statement.where(ExchangeRecord.user_id == current_user_id)
+    elif user_id:
+        statement = statement.where(ExchangeRecord.user_id == user_id)
+    
+    status = request.args.get('status')
+    if status:
+        statement = statement.where(ExchangeRecord.status == status)
+    return await record_list(session, request, ExchangeRecord, statement, serialize_exchange_records)
+
+
+ROUTES = [
+    (re.compile(r'^/api/products$'), get_products),
+    (re.compile(r'^/api/products/(\d+)$'), get_product),
+    (re.compile(r'^/api/stats/dashboard$'), get_dashboard_stats),
+    (re.compile(r'^/api/thumbs$'), get_thumbs_records),
+    (re.compile(r'^/api/exchanges$'), get_exchanges),
+]
+
+
+def match_route(method, path, headers):
+    # X-Debug-SQL 调试请求交给 Flask，由 sql_profiler 记录语句
+    if method != 'GET' or any(name.lower() == b'x-debug-sql' for name, _ in headers):
+        return None, ()
+    for pattern, handler in ROUTES:
+        matched = pattern.match(path)
+        if matched:
+            return handler, tuple(int(value) for value in matched.groups())
+    return None, ()
+
+
+async def send_response(send, request, response):
+    headers = [(b'content-type', b'application/json')] if response.status != 304 else []
+    headers.append((b'content-length', str(len(response.body)).encode()))
+    for name, value in response.headers.items():
+        headers.append((name.lower().encode('latin-1'), value.encode('latin-1')))
+    # 与 Flask-CORS 的默认配置一致
+    if 'origin' in request.headers:
+        headers.append((b'access-control-allow-origin', b'*'))
+    await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': response.body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            wsgi_app.executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI 应用"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    
+    handler, params = match_route(scope.get('method'), scope.get('path', ''), scope.get('headers', [])) if scope['type'] == 'http' else (None, ())
+    if handler is None:
+        return await wsgi_app(scope, receive, send)
+    
+    request = Request(scope)
+    # 与 Flask 共用同一个并发上限，超出时与 Flask 一样返回 503
+    if not limiter.gate.try_enter():
+        response = json_response({'code': 503, 'message': '服务繁忙，请稍后重试'}, 503)
+        response.headers['Retry-After'] = '1'
+        return await send_response(send, request, response)
+    
+    # 指标的接口名与 Flask 的 endpoint 相同（处理函数同名），交给 Flask 的请求由 Flask 记录
+    started = time.perf_counter()
+    request_metrics.request_started(handler.__name__)
+    try:
+        try:
+            async with Session() as session:
+                response = await handler(request, session, *params)
+        except Delegate:
+            request_metrics.request_cancelled(handler.__name__)
+            response = None
+        except Exception:
+            logger.exception('异步接口出错: %s', request.path)
+            response = json_response({'code': 500, 'message': '服务器内部错误'}, 500)
+        if response is not None:
+            await send_response(send, request, response)
+    finally:
+        limiter.gate.leave()
+    
+    if response is None:
+        return await wsgi_app(scope, receive, send)
+    request_metrics.request_finished(handler.__name__, 'GET', response.status, time.perf_counter() - started)
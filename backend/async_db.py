@@ -0,0 +1,33 @@
+"""异步数据库连接（ASGI 模式使用）
+
+与同步应用共用同一个库和同一套模型，只把驱动换成异步驱动：
+mysql+pymysql -> mysql+aiomysql，sqlite -> sqlite+aiosqlite。也可用 ASYNC_DATABASE_URL 直接指定。
+"""
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+ASYNC_DRIVERS = {
+    'mysql+pymysql': 'mysql+aiomysql',
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(url):
+    """把同步连接串换成对应的异步驱动"""
+    scheme, sep, rest = url.partition('://')
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def create_session_factory(config):
+    """按应用配置创建异步引擎，返回 (engine, session 工厂)"""
+    url = config.get('ASYNC_DATABASE_URL') or async_database_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    if not url.startswith('sqlite'):
+        options.update(
+            pool_size=config['ASYNC_DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_recycle=config['DB_POOL_RECYCLE']
+        )
+    engine = create_async_engine(url, **options)
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
@@ -0,0 +1,113 @@
+"""认证与权限
+
+登录时把角色 (role) 和令牌版本 (ver) 写入 JWT，权限判断直接读取令牌，不再查询用户表。
+修改或重置密码会让 token_version 加一，旧令牌随之失效；各进程缓存令牌版本 TOKEN_VERSION_TTL 秒，
+因此其他 worker 上的旧令牌最迟在该时间后失效。
+"""
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, jsonify
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, jwt_required
+from models import db, User
+
+_token_versions = {}
+_token_versions_lock = threading.Lock()
+
+
+def create_user_token(user):
+    """签发带角色和令牌版本的访问令牌"""
+    return create_access_token(
+        identity=user.id,
+        additional_claims={'role': user.role, 'ver': user.token_version or 0}
+    )
+
+
+def get_current_user():
+    """当前请求的用户对象，同一请求内只查询一次"""
+    if 'current_user' not in g:
+        g.current_user = User.query.get(get_jwt_identity())
+    return g.current_user
+
+
+def current_role():
+    """当前用户角色，优先取令牌中的声明；旧令牌没有该声明时回退到查库"""
+    role = get_jwt().get('role')
+    if role is None:
+        user = get_current_user()
+        role = user.role if user else None
+    return role
+
+
+def admin_required(message='无权限操作'):
+    """要求登录且为管理员"""
+    def decorator(view):
+        @wraps(view)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            if current_role() != 'admin':
+                return jsonify({'code': 403, 'message': message}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bump_token_version(user):
+    """使该用户已签发的令牌全部失效（在提交前调用）"""
+    user.token_version = (user.token_version or 0) + 1
+
+
+def remember_token_version(user):
+    """提交后刷新本进程的令牌版本缓存，使旧令牌在当前进程立即失效"""
+    with _token_versions_lock:
+        _token_versions[user.id] = (user.token_version or 0, time.monotonic() + current_app.config['TOKEN_VERSION_TTL'])
+
+
+def forget_token_versions(user_ids):
+    """批量 UPDATE 令牌版本提交后调用：丢弃本进程缓存的版本，下次请求重新查询，旧令牌立即失效"""
+    with _token_versions_lock:
+        for user_id in user_ids:
+            _token_versions.pop(user_id, None)
+
+
+def cached_token_version(user_id):
+    """缓存中的令牌版本，返回 (是否命中, 版本)"""
+    with _token_versions_lock:
+        cached = _token_versions.get(user_id)
+    if cached and cached[1] > time.monotonic():
+        return True, cached[0]
+    return False, None
+
+
+def store_token_version(user_id, version, ttl):
+    """缓存查到的令牌版本，用户不存在时 version 为 None"""
+    with _token_versions_lock:
+        _token_versions[user_id] = (version, time.monotonic() + ttl)
+
+
+def is_token_revoked(jwt_payload, version):
+    """令牌中的版本与当前版本不一致即视为吊销"""
+    return version is None or jwt_payload.get('ver', 0) != version
+
+
+def _get_token_version(user_id):
+    hit, version = cached_token_version(user_id)
+    if hit:
+        return version
+    
+    row = db.session.query(User.token_version).filter(User.id == user_id).first()
+    version = (row[0] or 0) if row else None
+    store_token_version(user_id, version, current_app.config['TOKEN_VERSION_TTL'])
+    return version
+
+
+def init_auth(jwt):
+    """注册令牌吊销检查"""
+
+    @jwt.token_in_blocklist_loader
+    def check_token_revoked(jwt_header, jwt_payload):
+        return is_token_revoked(jwt_payload, _get_token_version(jwt_payload['sub']))
+
+    @jwt.revoked_token_loader
+    def revoked_token_response(jwt_header, jwt_payload):
+        return jsonify({'code': 401, 'message': '登录已失效，请重新登录'}), 401
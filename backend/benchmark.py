@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基准测试脚本
+用合成数据建一个测试库（默认本地 SQLite 文件），启动真实的服务进程，用多个并发客户端请求
+登录、商品列表、大拇哥记录、大拇哥统计、兑换、发放大拇哥等接口，输出 p50/p95/p99 延迟、
+吞吐量和每个请求的 SQL 条数（取自服务端 /metrics），结果保存为 JSON，便于比较不同提交:
+
+    python benchmark.py                       # 完整数据量：5 万用户、500 万大拇哥记录、500 商品、100 万兑换记录
+    python benchmark.py --scale 0.01          # 按比例缩小，几十秒内跑完
+    python benchmark.py --baseline benchmarks/上次结果.json
+
+数据由固定随机种子生成，同一 --scale 生成的库保存在临时目录中，再次运行时直接复用（--reseed 重新生成）。
+也可用 --database-url 指定一个空的 MySQL 测试库。
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from compare_asgi import BACKEND_DIR, free_port, percentile, start_server
+
+FULL_DATASET = {'users': 50000, 'thumbs': 5000000, 'products': 500, 'exchanges': 1000000}
+SEED = 20240501
+BATCH_SIZE = 20000
+PASSWORD = 'bench123'
+TOKEN_USERS = 500  # 预先签发令牌的用户数，请求随机分摊到这些用户上
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='基准测试')
+    parser.add_argument('--database-url', help='测试用数据库连接串，默认临时目录中的 SQLite 文件')
+    parser.add_argument('--scale', type=float, default=1.0, help='数据量比例，1 为完整数据量')
+    parser.add_argument('--reseed', action='store_true', help='忽略已有数据重新生成')
+    parser.add_argument('--requests', type=int, default=2000, help='每个场景的请求数（登录为其 1/10）')
+    parser.add_argument('--concurrency', type=int, default=32, help='并发客户端数')
+    parser.add_argument('--threads', type=int, default=8, help='服务进程的线程数')
+    parser.add_argument('--only', help='只运行指定场景，逗号分隔')
+    parser.add_argument('--output', help='结果 JSON 路径，默认 benchmarks/<时间>-<提交>.json')
+    parser.add_argument('--baseline', help='与之前的结果 JSON 对比')
+    args = parser.parse_args()
+    # /metrics 只统计单个进程，固定为一个 worker 才能得到准确的每请求 SQL 条数
+    args.workers = 1
+    return args
+
+
+def dataset_size(scale):
+    return {name: max(int(count * scale), 10) for name, count in FULL_DATASET.items()}
+
+
+# ==================== 生成数据 ====================
+
+def seed(size, reseed):
+    """建表并写入合成数据，已有相同规模的数据时直接复用"""
+    from sqlalchemy import func, insert
+    from app import app, db, User, ThumbsRecord, Product, ExchangeRecord
+    from passwords import hasher
+    
+    with app.app_context():
+        db.create_all()
+        existing = db.session.query(func.count(User.id)).filter(User.username.like('bench_%')).scalar()
+        if existing and not reseed:
+            if existing != size['users'] + 1:
+                raise RuntimeError(f'库中已有 {existing - 1} 个测试用户，与本次数据量不符，请加 --reseed 或换一个库')
+            print(f"[√] 复用已有测试数据（{existing - 1} 个用户）")
+            return
+        if existing:
+            db.drop_all()
+            db.create_all()
+        
+        rng = random.Random(SEED)
+        now = datetime.utcnow()
+        password = hasher.hash(PASSWORD)
+        started = time.perf_counter()
+        
+        def insert_rows(model, rows, total):
+            batch = []
+            for index, row in enumerate(rows, 1):
+                batch.append(row)
+                if len(batch) >= BATCH_SIZE or index == total:
+                    db.session.execute(insert(model), batch)
+                    db.session.commit()
+                    batch = []
+                    print(f"\r    {model.__tablename__}: {index}/{total}", end='', flush=True)
+            print()
+        
+        def random_time():
+            return now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        
+        insert_rows(User, ({
+            'username': 'bench_admin' if i == 0 else f'bench_{i}',
+            'password': password,
+            'real_name': '压测管理员' if i == 0 else f'压测用户{i}',
+            'role': 'admin' if i == 0 else 'user',
+            # 积分给足，兑换不会因余额不足失败；计数与明细不要求一致
+            'total_points': 10 ** 8,
+            'available_points': 10 ** 8,
+            'single_thumbs': 0,
+            'double_thumbs': 0,
+            'total_exchanges': 0,
+            'token_version': 0,
+            'is_active': True,
+            'created_at': random_time()
+        } for i in range(size['users'] + 1)), size['users'] + 1)
+        
+        insert_rows(Product, ({
+            'name': f'压测商品{i}',
+            'description': f'基准测试商品 {i}',
+            'points_required': rng.randint(1, 50) * 10,
+            'stock': 10 ** 8,
+            'status': 'on_shelf' if i % 10 else 'off_shelf',
+            'sort_order': rng.randint(0, 100),
+            'created_at': random_time()
+        } for i in range(size['products'])), size['products'])
+        
+        admin_id = db.session.query(User.id).filter_by(username='bench_admin').scalar()
+        first_user = admin_id + 1
+        
+        def thumbs_rows():
+            for _ in range(size['thumbs']):
+                thumb_type = 'single' if rng.random() < 0.8 else 'double'
+                yield {
+                    'user_id': rng.randint(first_user, first_user + size['users'] - 1),
+                    'thumb_type': thumb_type,
+                    'points': 1 if thumb_type == 'single' else 5,
+                    'reason': '基准测试',
+                    'given_by': admin_id,
+                    'created_at': random_time()
+                }
+        insert_rows(ThumbsRecord, thumbs_rows(), size['thumbs'])
+        
+        def exchange_rows():
+            for _ in range(size['exchanges']):
+                product_id = rng.randint(1, size['products'])
+                yield {
+                    'user_id': rng.randint(first_user, first_user + size['users'] - 1),
+                    'product_id': product_id,
+                    'product_name': f'压测商品{product_id - 1}',
+                    'points_spent': 100,
+                    'quantity': 1,
+                    'status': rng.choice(('completed', 'completed', 'completed', 'pending', 'cancelled')),
+                    'created_at': random_time()
+                }
+        insert_rows(ExchangeRecord, exchange_rows(), size['exchanges'])
+        
+        print(f"[√] 测试数据生成完成，用时 {time.perf_counter() - started:.0f} 秒")
+
+
+def issue_tokens(size):
+    """签发管理员和部分用户的令牌，返回 (管理员令牌, [(用户ID, 用户名, 令牌)], 在架商品ID)"""
+    from app import app, User, Product
+    from auth import create_user_token
+    
+    rng = random.Random(SEED + 1)
+    with app.app_context():
+        admin = User.query.filter_by(username='bench_admin').one()
+        names = [f'bench_{i}' for i in rng.sample(range(1, size['users'] + 1), min(TOKEN_USERS, size['users']))]
+        users = [(user.id, user.username, create_user_token(user)) for user in User.query.filter(User.username.in_(names))]
+        products = [product_id for product_id, in Product.query.with_entities(Product.id).filter_by(status='on_shelf')]
+        return create_user_token(admin), users, products
+
+
+# ==================== 场景 ====================
+
+def build_scenarios(admin_token, users, products, size):
+    """场景名（与 Flask endpoint 名一致）-> 生成单个请求 (方法, 路径, 请求体, 令牌) 的函数"""
+    thumbs_pages = max(size['thumbs'] // 20, 1)
+    product_pages = max(len(products) // 20, 1)
+    return {
+        'login': lambda rng: (
+            'POST', '/api/auth/login', {'username': rng.choice(users)[1], 'password': PASSWORD}, None
+        ),
+        'get_products': lambda rng: (
+            'GET', f'/api/products?status=on_shelf&page={rng.randint(1, product_pages)}', None, rng.choice(users)[2]
+        ),
+        'get_thumbs_records': lambda rng: (
+            # 前 50 页（最常用的翻页范围）和按用户筛选各占一半
+            'GET', f'/api/thumbs?page={rng.randint(1, min(thumbs_pages, 50))}&per_page=20', None, admin_token
+        ) if rng.random() < 0.5 else (
+            'GET', f'/api/thumbs?user_id={rng.choice(users)[0]}&per_page=20', None, admin_token
+        ),
+        'get_thumbs_stats': lambda rng: (
+            'GET', '/api/thumbs/stats', None, rng.choice(users)[2]
+        ),
+        'create_exchange': lambda rng: (
+            'POST', '/api/exchanges', {'product_id': rng.choice(products), 'quantity': 1}, rng.choice(users)[2]
+        ),
+        'give_thumbs': lambda rng: (
+            'POST', '/api/thumbs',
+            {'user_id': rng.choice(users)[0], 'thumb_type': rng.choice(('single', 'double')), 'reason': '基准测试'},
+            admin_token
+        ),
+    }
+
+
+def run_scenario(port, make_request, requests, concurrency):
+    """每个客户端一条长连接，返回 (每秒请求数, 延迟毫秒列表, 失败数)"""
+    per_client = max(requests // concurrency, 1)
+    
+    def client(index):
+        rng = random.Random(SEED + index)
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        latencies, errors = [], 0
+        for _ in range(per_client):
+            method, path, body, token = make_request(rng)
+            headers = {'Content-Type': 'application/json'}
+            if token:
+                headers['Authorization'] = f'Bearer {token}'
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors += 1
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            latencies.append((time.perf_counter() - started) * 1000)
+        connection.close()
+        return latencies, errors
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    latencies = sorted(latency for result in results for latency in result[0])
+    return len(latencies) / elapsed, latencies, sum(result[1] for result in results)
+
+
+_metric_line = re.compile(r'^(numbmall_http_request_db_queries_(?:sum|count)|numbmall_db_query_duration_seconds_total)'
+                          r'\{endpoint="([^"]+)"\} (\S+)$')
+
+
+def scrape_sql_metrics(port):
+    """读取服务端 /metrics，返回 {endpoint: (SQL 总条数, 请求数, SQL 总耗时秒)}"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.request('GET', '/metrics', headers={'Authorization': f"Bearer {os.environ['METRICS_TOKEN']}"})
+    text = connection.getresponse().read().decode()
+    connection.close()
+    
+    values = {}
+    for line in text.splitlines():
+        matched = _metric_line.match(line)
+        if matched:
+            name, endpoint, value = matched.groups()
+            values.setdefault(endpoint, {})[name] = float(value)
+    return {
+        endpoint: (
+            metrics.get('numbmall_http_request_db_queries_sum', 0),
+            metrics.get('numbmall_http_request_db_queries_count', 0),
+            metrics.get('numbmall_db_query_duration_seconds_total', 0)
+        )
+        for endpoint, metrics in values.items()
+    }
+
+
+# ==================== 报告 ====================
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_results(results, baseline):
+    previous = {result['scenario']: result for result in baseline['results']} if baseline else {}
+    print(f"\n{'场景':<20}{'请求/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'SQL/请求':>10}{'失败':>6}")
+    for result in results:
+        print(
+            f"{result['scenario']:<20}{result['rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+            f"{result['p99_ms']:>10}{result['queries_per_request']:>10}{result['errors']:>6}"
+        )
+        old = previous.get(result['scenario'])
+        if old:
+            changes = []
+            for key, label in (('rps', '吞吐'), ('p95_ms', 'p95'), ('queries_per_request', 'SQL/请求')):
+                if old[key]:
+                    changes.append(f"{label} {(result[key] - old[key]) / old[key] * 100:+.1f}%")
+            print(f"{'  对比基线':<20}{'，'.join(changes)}")
+
+
+def main():
+    args = parse_args()
+    size = dataset_size(args.scale)
+    
+    # 必须在导入 app 之前设置，服务子进程从环境变量继承
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        db_path = os.path.join(tempfile.gettempdir(), f'numbmall-bench-{args.scale:g}.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+        print(f"测试库: {db_path}")
+    os.environ['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN') or f'bench-{os.getpid()}'
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'  # 登录等场景会远超单用户限额
+    
+    seed(size, args.reseed)
+    admin_token, users, products = issue_tokens(size)
+    scenarios = build_scenarios(admin_token, users, products, size)
+    if args.only:
+        scenarios = {name: scenarios[name] for name in args.only.split(',')}
+    
+    results = []
+    port = free_port()
+    process = start_server('sync', port, args)
+    try:
+        for name, make_request in scenarios.items():
+            requests = args.requests // 10 if name == 'login' else args.requests
+            run_scenario(port, make_request, min(requests, args.concurrency * 5), args.concurrency)  # 预热
+            before = scrape_sql_metrics(port).get(name, (0, 0, 0))
+            rps, latencies, errors = run_scenario(port, make_request, requests, args.concurrency)
+            after = scrape_sql_metrics(port).get(name, (0, 0, 0))
+            
+            count = after[1] - before[1]
+            results.append({
+                'scenario': name,
+                'requests': len(latencies),
+                'errors': errors,
+                'rps': round(rps, 1),
+                'p50_ms': round(percentile(latencies, 0.5), 2),
+                'p95_ms': round(percentile(latencies, 0.95), 2),
+                'p99_ms': round(percentile(latencies, 0.99), 2),
+                'queries_per_request': round((after[0] - before[0]) / count, 2) if count else None,
+                'db_ms_per_request': round((after[2] - before[2]) / count * 1000, 3) if count else None
+            })
+            print(f"[√] {name} 完成")
+    finally:
+        process.terminate()
+        process.wait()
+    
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    
+    commit = git_commit()
+    output = args.output or os.path.join(
+        BACKEND_DIR, 'benchmarks', f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'database': os.environ['DATABASE_URL'].split('://')[0],
+            'dataset': size,
+            'args': {key: value for key, value in vars(args).items() if key != 'database_url'},
+            'results': results
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n[√] 结果已保存到 {output}")
+
+
+if __name__ == '__main__':
+    print("=" * 50)
+    print("基准测试")
+    print("=" * 50)
+    
+    main()
@@ -0,0 +1,156 @@
+"""进程内缓存
+
+仅缓存在当前 worker 进程内，多进程部署时各自独立，靠 TTL 限制数据陈旧时间。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class AggregateCache:
+    """统计数字缓存：TTL 过期后重新加载，写接口可原地增减或直接失效"""
+    
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._values = None
+        self._expires_at = 0
+        self._generation = 0  # adjust()/invalidate() 时加一，统计期间有变更则不写入结果
+        self._loading = False
+        self._lock = threading.Lock()
+        self._loaded = threading.Condition(self._lock)
+    
+    def get(self, loader):
+        """读取缓存，未命中或已过期时调用 loader() 重新统计
+
+        同一时间只有一个线程在锁外执行 loader()；其他线程在此期间返回上一份结果，
+        没有可用结果（首次读取或刚被 invalidate）时等待统计完成。
+        """
+        with self._lock:
+            while True:
+                if self._values is not None and (self._loading or time.monotonic() < self._expires_at):
+                    self.hits += 1
+                    return dict(self._values)
+                if not self._loading:
+                    break
+                self._loaded.wait()
+            self.misses += 1
+            self._loading = True
+            generation = self._generation
+        
+        values = None
+        try:
+            values = loader()
+        finally:
+            with self._lock:
+                self._loading = False
+                if values is not None and generation == self._generation:
+                    self._values = dict(values)
+                    self._expires_at = time.monotonic() + self.ttl
+                self._loaded.notify_all()
+        return dict(values)
+    
+    def lookup(self):
+        """只读缓存（异步接口用），返回 (统计结果, 版本)；未命中时结果为 None，由调用方统计后 store(结果, 版本)"""
+        with self._lock:
+            if self._values is not None and time.monotonic() < self._expires_at:
+                self.hits += 1
+                return dict(self._values), self._generation
+            self.misses += 1
+            return None, self._generation
+    
+    def store(self, values, generation):
+        """写入统计结果；lookup() 之后有过 adjust()/invalidate() 时结果可能已过时，丢弃，返回是否写入"""
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._values = dict(values)
+            self._expires_at = time.monotonic() + self.ttl
+            self._generation += 1
+            return True
+    
+    def adjust(self, key, delta):
+        """写操作提交后原地调整某项统计，缓存为空时无需处理"""
+        with self._lock:
+            self._generation += 1
+            if self._values is not None:
+                self._values[key] += delta
+    
+    def invalidate(self):
+        """丢弃缓存，下次读取时重新统计"""
+        with self._lock:
+            self._generation += 1
+            self._values = None
+    
+    def stats(self):
+        """命中统计"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0,
+            'ttl': self.ttl
+        }
+
+
+class ResponseCache:
+    """响应缓存：按 key 保存序列化好的 JSON 响应体及其 ETag
+
+    数据变更时调用 bump() 使全部条目失效。ETag 取响应体的哈希，
+    多个 worker 对相同内容给出相同的 ETag。
+    bump() 只作用于当前进程，其他 worker 的条目靠 ttl 过期：写操作后最多 ttl 秒内
+    其他进程仍可能返回旧内容（及旧 ETag 的 304）。
+    """
+    
+    def __init__(self, max_entries=512, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """返回 (body, etag)，未命中返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry[2]:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[:2]
+    
+    def set(self, key, body, version):
+        """写入缓存；version 为读库前取到的版本号，期间若已 bump 则不写入，避免缓存旧数据"""
+        entry = (body, hashlib.sha256(body).hexdigest()[:32])
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = entry + (time.monotonic() + self.ttl,)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+    
+    def bump(self):
+        """数据已变更，作废全部缓存"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+    
+    def stats(self):
+        """命中统计"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0,
+            'entries': len(self._entries),
+            'version': self.version,
+            'ttl': self.ttl
+        }
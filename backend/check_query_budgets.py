@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+接口 SQL 条数回归检查
+在内存 SQLite 库中写入测试数据，用 Flask 测试客户端依次请求每个接口，通过 SQLAlchemy 的
+before_cursor_execute 事件统计每个请求执行的语句数（含流式响应在发送过程中执行的语句），检查：
+1. 不超过接口上 @query_budget(n) 声明的预算
+2. 列表、批量类接口在 10 条和 100 条时语句数相同（与分页大小无关，出现 N+1 懒加载会直接失败）
+3. 每个接口都声明了预算，并且都有对应的检查用例（新增接口后需在 CASES 中补充）
+
+每次请求前清空令牌版本缓存、商品目录缓存、仪表板统计缓存和排行榜，按最坏情况计数。
+修改接口或序列化代码后运行，全部通过时退出码为 0:
+
+    python check_query_budgets.py
+"""
+
+import io
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+# 只统计语句数，用低迭代次数的哈希加快建用户和导入
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app, db, catalog_cache, dashboard_cache, leaderboard
+from models import User, ThumbsRecord, Product, ExchangeRecord, IdempotencyKey
+from auth import create_user_token
+from idempotency import request_fingerprint
+import uploads
+import app as app_module
+
+SMALL, LARGE = 10, 100
+
+# (接口名, 方法, 路径, 身份, 请求体[, 额外请求头])；路径、请求体和请求头可以是以条数 n 为参数的函数，此时分别用 SMALL 和 LARGE 各请求一次
+# 身份为 admin / user（u1）/ u2 / None；请求体为 ('file', 文件名, 内容) 时以 multipart 上传
+CASES = [
+    ('login', 'POST', '/api/auth/login', None, {'username': 'u1', 'password': 'pw'}),
+    ('register', 'POST', '/api/auth/register', None, {'username': 'newcomer', 'password': 'pw', 'real_name': '新人'}),
+    ('get_user_info', 'GET', '/api/auth/info', 'user', None),
+    # 修改密码会使令牌失效，用单独的用户，不影响后续用例
+    ('change_password', 'POST', '/api/auth/change-password', 'u2', {'old_password': 'pw', 'new_password': 'pw'}),
+    
+    ('get_users', 'GET', lambda n: f'/api/users?per_page={n}', 'admin', None),
+    ('get_users', 'GET', lambda n: f'/api/users?cursor=&per_page={n}', 'admin', None),
+    ('search_users', 'GET', lambda n: f'/api/users/search?q=u&limit={min(n, 50)}', 'admin', None),
+    ('create_user', 'POST', '/api/users', 'admin', {'username': 'created', 'password': 'pw', 'real_name': '新建'}),
+    ('import_users', 'POST', '/api/users/import', 'admin',
+     lambda n: {'users': [{'username': f'imported{n}_{i}', 'real_name': f'导入{i}'} for i in range(n)],
+                'default_password': 'pw'}),
+    ('import_users', 'POST', '/api/users/import', 'admin',
+     lambda n: {'users': [{'username': f'u{i}', 'real_name': f'同步{i}'} for i in range(min(n, 30))], 'sync': True}),
+    # 新增、按不同字段组合更新、停用同时发生：语句数只随字段组合数变化，与人数无关
+    ('import_users', 'POST', '/api/users/import', 'admin',
+     lambda n: {'users': [
+         {'username': f'u{i}', 'real_name': f'名单同步{n}', **({'email': f'u{i}.{n}@example.com'} if i % 2 else {'phone': f'138{n:04d}{i:04d}'})}
+         for i in range(30)
+     ] + [{'username': f'roster{n}_{i}', 'real_name': f'名单{i}'} for i in range(n)],
+        'sync': True, 'deactivate_missing': True, 'default_password': 'pw'}),
+    ('update_user', 'PUT', '/api/users/5', 'admin', {'real_name': '改名', 'email': 'u3@example.com'}),
+    ('reset_user_password', 'POST', '/api/users/6/reset-password', 'admin', {'new_password': 'pw2'}),
+    ('get_user_balance', 'GET', '/api/users/3/balance', 'admin', None),
+    
+    ('give_thumbs', 'POST', '/api/thumbs', 'admin', {'user_id': 3, 'thumb_type': 'double', 'reason': '检查'}),
+    ('give_thumbs', 'POST', '/api/thumbs', 'admin', {'user_id': 3, 'thumb_type': 'single'}, {'Idempotency-Key': 'check-thumbs'}),
+    # takeover- 开头的键在 seed() 中预先写入超过租期的"处理中"记录：占用失败、读取、删除、重新占用、保存
+    ('give_thumbs', 'POST', '/api/thumbs', 'admin', {'user_id': 3, 'thumb_type': 'single'}, {'Idempotency-Key': 'takeover-thumbs'}),
+    ('give_thumbs_batch', 'POST', '/api/thumbs/batch', 'admin',
+     lambda n: {'items': [{'user_id': 2 + i % 30, 'thumb_type': ('single', 'double')[i % 2]} for i in range(n)]}),
+    ('give_thumbs_batch', 'POST', '/api/thumbs/batch', 'admin',
+     lambda n: {'items': [{'user_id': 2 + i % 30, 'thumb_type': 'single'} for i in range(n)]},
+     lambda n: {'Idempotency-Key': f'check-batch-{n}'}),
+    ('give_thumbs_batch', 'POST', '/api/thumbs/batch', 'admin',
+     lambda n: {'items': [{'user_id': 2 + i % 30, 'thumb_type': 'single'} for i in range(n)]},
+     lambda n: {'Idempotency-Key': f'takeover-batch-{n}'}),
+    ('get_thumbs_records', 'GET', lambda n: f'/api/thumbs?per_page={n}', 'admin', None),
+    ('get_thumbs_records', 'GET', lambda n: f'/api/thumbs?cursor=&per_page={n}&with_total=1', 'admin', None),
+    ('get_thumbs_stats', 'GET', '/api/thumbs/stats', 'user', None),
+    ('get_leaderboard', 'GET', lambda n: f'/api/leaderboard?limit={n}', 'user', None),
+    ('get_leaderboard', 'GET', lambda n: f'/api/leaderboard?window=week&limit={n}', 'user', None),
+    
+    ('get_products', 'GET', lambda n: f'/api/products?per_page={n}', None, None),
+    ('get_product', 'GET', '/api/products/1', None, None),
+    ('create_product', 'POST', '/api/products', 'admin', {'name': '新商品', 'points_required': 5, 'stock': 3, 'status': 'on_shelf'}),
+    ('update_product', 'PUT', '/api/products/2', 'admin', {'stock': 20, 'status': 'on_shelf'}),
+    ('toggle_product_status', 'POST', '/api/products/3/toggle-status', 'admin', None),
+    ('delete_product', 'DELETE', '/api/products/3', 'admin', None),
+    
+    ('create_exchange', 'POST', '/api/exchanges', 'user', {'product_id': 1, 'quantity': 1}),
+    ('create_exchange', 'POST', '/api/exchanges', 'user', {'product_id': 1, 'quantity': 1}, {'Idempotency-Key': 'check-exchange'}),
+    ('create_exchange', 'POST', '/api/exchanges', 'user', {'product_id': 1, 'quantity': 1}, {'Idempotency-Key': 'takeover-exchange'}),
+    ('get_exchanges', 'GET', lambda n: f'/api/exchanges?per_page={n}', 'admin', None),
+    ('get_exchanges', 'GET', lambda n: f'/api/exchanges?cursor=&per_page={n}', 'user', None),
+    ('cancel_exchange', 'POST', '/api/exchanges/2/cancel', 'admin', None),
+    ('export_thumbs_records', 'GET', '/api/export/thumbs?format=csv', 'admin', None),
+    ('export_exchange_records', 'GET', '/api/export/exchanges?format=ndjson', 'admin', None),
+    
+    ('upload_file', 'POST', '/api/upload', 'admin', ('file', 'check.png', None)),
+    ('get_upload_file', 'GET', lambda n: '/api/uploads/' + uploaded['filename'], None, None),
+    
+    ('get_dashboard_stats', 'GET', '/api/stats/dashboard', 'admin', None),
+    ('get_dashboard_stats', 'GET', '/api/stats/dashboard', 'user', None),
+    ('get_password_hasher_stats', 'GET', '/api/stats/password-hasher', 'admin', None),
+    ('get_db_pool_stats', 'GET', '/api/stats/db-pool', 'admin', None),
+    ('get_cache_stats', 'GET', '/api/stats/cache', 'admin', None),
+    ('get_metrics', 'GET', '/metrics', None, None),
+]
+
+# 不访问数据库、无需检查的路由
+SKIPPED = {'static'}
+
+uploaded = {}
+statements = []
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _record(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+
+def seed():
+    db.create_all()
+    admin = User(username='admin', real_name='管理员', role='admin')
+    admin.set_password('admin123')
+    db.session.add(admin)
+    users = []
+    for i in range(30):
+        user = User(username=f'u{i}', real_name=f'用户{i}', role='user', total_points=1000, available_points=1000)
+        user.set_password('pw')
+        users.append(user)
+    db.session.add_all(users)
+    db.session.add_all([
+        Product(name='充电宝', points_required=10, stock=1000, status='on_shelf'),
+        Product(name='雨伞', points_required=20, stock=0, status='off_shelf'),
+        Product(name='水杯', points_required=5, stock=10, status='on_shelf'),
+    ])
+    db.session.flush()
+    # 记录分散在不同用户名下，逐条懒加载用户会让语句数随条数增长
+    db.session.add_all([
+        ThumbsRecord(user_id=users[i % 30].id, thumb_type='single', points=1, reason='初始', given_by=admin.id)
+        for i in range(250)
+    ])
+    db.session.add_all([
+        ExchangeRecord(user_id=users[i % 30].id, product_id=1, product_name='充电宝', points_spent=10, status='completed')
+        for i in range(150)
+    ])
+    db.session.commit()
+    seed_abandoned_keys({'admin': admin.id, 'user': users[1].id, 'u2': users[2].id})
+    return {
+        'admin': {'Authorization': f'Bearer {create_user_token(admin)}'},
+        'user': {'Authorization': f'Bearer {create_user_token(users[1])}'},
+        'u2': {'Authorization': f'Bearer {create_user_token(users[2])}'},
+        None: {}
+    }
+
+
+def seed_abandoned_keys(user_ids):
+    """为 takeover- 开头的幂等键写入超过租期仍"处理中"的记录，模拟第一个请求中途崩溃"""
+    created_at = datetime.utcnow() - timedelta(seconds=app.config['IDEMPOTENCY_LEASE_SECONDS'] + 1)
+    for endpoint, method, path, role, body, *extra in CASES:
+        for n in (SMALL, LARGE) if callable(path) or callable(body) or (extra and callable(extra[0])) else (None,):
+            headers = extra[0](n) if extra and callable(extra[0]) else (extra[0] if extra else {})
+            key = headers.get('Idempotency-Key', '')
+            if not key.startswith('takeover-'):
+                continue
+            data = app.json.dumps(body(n) if callable(body) else body).encode()
+            db.session.add(IdempotencyKey(
+                user_id=user_ids[role], idempotency_key=key, created_at=created_at,
+                request_hash=request_fingerprint(method, path(n) if callable(path) else path, data)
+            ))
+    db.session.commit()
+
+
+def png_bytes():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), (200, 80, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def reset_caches():
+    catalog_cache.bump()
+    dashboard_cache.invalidate()
+    leaderboard.invalidate()
+
+
+def run(client, headers, method, path, body):
+    """返回 (响应, 语句数)；读完响应体，流式响应发送过程中的语句也计入"""
+    reset_caches()
+    kwargs = {'headers': headers}
+    if isinstance(body, tuple):
+        kwargs['data'] = {'file': (io.BytesIO(png_bytes()), body[1])}
+        kwargs['content_type'] = 'multipart/form-data'
+    elif body is not None:
+        kwargs['json'] = body
+    statements.clear()
+    response = client.open(path, method=method, **kwargs)
+    response.get_data()
+    if response.status_code == 200 and path == '/api/upload':
+        uploaded.update(response.get_json()['data'])
+    return response, len(statements)
+
+
+def main():
+    # 令牌版本缓存立即过期：每个需要登录的请求都计入校验令牌的那条查询
+    app.config.update(TESTING=True, TOKEN_VERSION_TTL=0, EXPORT_BATCH_SIZE=10, UPLOAD_VARIANTS_ASYNC=False)
+    upload_dir = tempfile.mkdtemp()
+    uploads.UPLOAD_FOLDER = app_module.UPLOAD_FOLDER = upload_dir
+    
+    failures = []
+    covered = set()
+    with app.app_context():
+        tokens = seed()
+    client = app.test_client()
+    
+    print(f"{'接口':<30}{'方法':<8}{'语句数':>10}{'预算':>6}  路径")
+    for endpoint, method, path, role, body, *extra in CASES:
+        covered.add(endpoint)
+        budget = getattr(app.view_functions[endpoint], 'query_budget', None)
+        scaled = callable(path) or callable(body) or (extra and callable(extra[0]))
+        sizes = (SMALL, LARGE) if scaled else (None,)
+        
+        counts = []
+        for n in sizes:
+            headers = extra[0](n) if extra and callable(extra[0]) else (extra[0] if extra else {})
+            response, count = run(
+                client, {**tokens[role], **headers}, method,
+                path(n) if callable(path) else path,
+                body(n) if callable(body) else body
+            )
+            if response.status_code >= 400:
+                message = (response.get_json(silent=True) or {}).get('message')
+                failures.append(f'{endpoint} {method} 返回 HTTP {response.status_code}（{message}），用例数据需要调整')
+            counts.append(count)
+        
+        shown_path = path(LARGE) if callable(path) else path
+        shown = ' / '.join(str(count) for count in counts)
+        ok = budget is not None and max(counts) <= budget and len(set(counts)) == 1
+        print(f"{'[√] ' if ok else '[×] '}{endpoint:<26}{method:<8}{shown:>10}{budget if budget is not None else '-':>6}  {shown_path}")
+        
+        if budget is None:
+            failures.append(f'{endpoint} 没有声明 @query_budget')
+        elif max(counts) > budget:
+            failures.append(f'{endpoint} {shown_path} 执行了 {max(counts)} 条 SQL，超出预算 {budget} 条')
+        if len(set(counts)) > 1:
+            failures.append(f'{endpoint} {method} 的语句数随条数变化（{SMALL} 条: {counts[0]}，{LARGE} 条: {counts[1]}），可能有 N+1 查询')
+    
+    for endpoint in sorted(set(app.view_functions) - covered - SKIPPED):
+        failures.append(f'{endpoint} 没有检查用例，请在 CASES 中补充')
+    
+    if failures:
+        print(f"\n[×] {len(failures)} 项未通过:")
+        for failure in failures:
+            print(f"    - {failure}")
+        return 1
+    print(f"\n[√] 全部 {len(CASES)} 个用例通过")
+    return 0
+
+
+if __name__ == '__main__':
+    print("=" * 50)
+    print("接口 SQL 条数检查")
+    print("=" * 50)
+    
+    sys.exit(main())
@@ -15,10 +15,66 @@ class Config:
     MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'thumbs_mall')
     
     # SQLAlchemy 配置
-    SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}?charset=utf8mb4'
+    # DATABASE_URL 可直接指定完整连接串（如压测脚本使用的临时 SQLite 库）
+    SQLALCHEMY_DATABASE_URI = os.getenv(
+        'DATABASE_URL',
+        f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}?charset=utf8mb4'
+    )
+    # ASGI 模式（asgi.py）的异步连接，默认由上面的连接串换成 aiomysql / aiosqlite 驱动
+    ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL', '')
+    ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', 10))  # 其余连接池参数与下面的 DB_POOL_* 相同
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
     
+    # 连接池配置（每个 worker 进程一个连接池，最多 DB_POOL_SIZE + DB_MAX_OVERFLOW 个连接）
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))  # 常驻连接数
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))  # 高峰时允许额外创建的连接数
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # 连接全部借出时的最长等待秒数
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))  # 连接最长使用秒数，需小于 MySQL 的 wait_timeout
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'  # 借出前检测连接是否已断开
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING
+    }
+    # ASGI 模式下交给 Flask 处理的请求的线程数（每个进程），默认与同步连接池上限相同
+    ASGI_SYNC_THREADS = int(os.getenv('ASGI_SYNC_THREADS', DB_POOL_SIZE + DB_MAX_OVERFLOW))
+    
+    # 只读副本（逗号分隔的连接串，为空时全部走主库）：GET 请求的查询发往副本，
+    # 有写操作的用户此后 REPLICA_PIN_SECONDS 秒内的读请求仍走主库，需大于副本的最大复制延迟
+    DATABASE_REPLICA_URLS = os.getenv('DATABASE_REPLICA_URLS', '')
+    REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+    
+    # GET /metrics 的访问令牌（Prometheus 配置 authorization.credentials），为空时不校验
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    
+    # SQL 分析：超过该毫秒数的语句记录慢查询日志（0 关闭）；管理员请求带 X-Debug-SQL: 1 时响应附带语句列表
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+    SQL_DEBUG_ENABLED = os.getenv('SQL_DEBUG_ENABLED', 'true').lower() == 'true'
+    SQL_DEBUG_MAX_STATEMENTS = int(os.getenv('SQL_DEBUG_MAX_STATEMENTS', 200))  # 调试响应最多列出的语句数
+    
+    # 限流配置："次数/周期"（second/minute/hour/day），为空或 0 不限；多进程部署时用 redis:// 共享计数
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_STORAGE_URL = os.getenv('RATE_LIMIT_STORAGE_URL', 'memory://')
+    RATE_LIMIT_TRUST_PROXY = os.getenv('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true'  # 部署在 Nginx 后时开启，按 X-Real-IP 限流
+    RATE_LIMIT_AUTH_IP = os.getenv('RATE_LIMIT_AUTH_IP', '30/minute')  # 登录/注册，每个 IP
+    RATE_LIMIT_AUTH_USERNAME = os.getenv('RATE_LIMIT_AUTH_USERNAME', '10/minute')  # 登录/注册，每个用户名
+    RATE_LIMIT_PASSWORD_USER = os.getenv('RATE_LIMIT_PASSWORD_USER', '10/minute')  # 修改密码，每个用户
+    RATE_LIMIT_EXCHANGE_USER = os.getenv('RATE_LIMIT_EXCHANGE_USER', '20/minute')  # 兑换，每个用户
+    RATE_LIMIT_UPLOAD_USER = os.getenv('RATE_LIMIT_UPLOAD_USER', '30/minute')  # 上传，每个用户
+    MAX_IN_FLIGHT_REQUESTS = int(os.getenv('MAX_IN_FLIGHT_REQUESTS', 256))  # 每个进程同时处理的请求上限，超出返回 503（0 不限）
+    
+    # 幂等键：兑换、发放大拇哥的成功响应保存秒数，以及重复请求等待第一个请求完成的最长秒数
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 24 * 60 * 60))
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 10))
+    # "处理中"的幂等键的租期，超过后视为第一个请求已中断，可由重复请求接手；需大于接口的最长处理时间
+    IDEMPOTENCY_LEASE_SECONDS = int(os.getenv('IDEMPOTENCY_LEASE_SECONDS', 60))
+    
+    # 查询预算：超出时抛异常而不是只记录警告（测试环境建议开启）
+    QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+    
     # Flask 配置
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
     JSON_AS_ASCII = False  # 支持中文显示
@@ -26,12 +82,37 @@ class Config:
     # JWT 配置
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
     JWT_ACCESS_TOKEN_EXPIRES = 24 * 60 * 60  # 24小时
+    TOKEN_VERSION_TTL = int(os.getenv('TOKEN_VERSION_TTL', 60))  # 令牌版本缓存秒数，即改密后其他进程上旧令牌的最长有效时间
+    
+    # 缓存配置
+    DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 60))  # 管理员仪表板统计缓存秒数
+    CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 512))  # 商品目录缓存条目上限
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 30))  # 商品目录缓存秒数，即其他进程修改商品后最长多久可见
+    LEADERBOARD_REFRESH = int(os.getenv('LEADERBOARD_REFRESH', 300))  # 排行榜重新载入秒数，即其他进程发放的积分最长多久后可见
+    
+    # 密码哈希配置
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')  # 调整后老用户登录成功时自动重新哈希
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))  # 同时计算哈希的线程数
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv('PASSWORD_HASH_QUEUE_LIMIT', 64))  # 排队上限，超过返回 503
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))  # 单次等待秒数
+    
+    # 搜索配置
+    SEARCH_NGRAM_TOKEN_SIZE = int(os.getenv('SEARCH_NGRAM_TOKEN_SIZE', 2))  # 与 MySQL 的 ngram_token_size 保持一致
     
     # 分页配置
     ITEMS_PER_PAGE = 20
+    USER_IMPORT_CHUNK_SIZE = int(os.getenv('USER_IMPORT_CHUNK_SIZE', 500))  # 批量导入用户时每条 INSERT 的行数
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))  # 导出时每批从服务端游标读取的行数
     
     # 上传配置
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    UPLOAD_MAX_IMAGE_PIXELS = int(os.getenv('UPLOAD_MAX_IMAGE_PIXELS', 40000000))  # 图片像素数上限（约 8000x5000），超过拒绝上传
+    UPLOAD_VARIANTS_ASYNC = os.getenv('UPLOAD_VARIANTS_ASYNC', 'false').lower() == 'true'  # 缩略图是否在后台线程生成
+    UPLOAD_MAX_AGE = 365 * 24 * 60 * 60  # 内容哈希命名的图片缓存一年
+    UPLOAD_MUTABLE_MAX_AGE = 60 * 60  # 其他文件缓存一小时
+    # nginx 内部 location 前缀（如 /protected-uploads/），设置后由 nginx 发送文件，见 DEPLOY.md
+    UPLOAD_ACCEL_REDIRECT_PREFIX = os.getenv('UPLOAD_ACCEL_REDIRECT_PREFIX', '')
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'  # Apache/lighttpd 的 X-Sendfile
 
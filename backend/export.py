@@ -0,0 +1,168 @@
+"""记录导出
+
+大拇哥记录和兑换记录按主键顺序用服务端游标 (stream_results + yield_per) 逐批读取，
+每批立即编码成 CSV / NDJSON 写给客户端，内存占用与总行数无关。
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from models import db, User, ThumbsRecord, ExchangeRecord
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+
+THUMB_TYPE_NAMES = {'single': '单大拇哥👍', 'double': '双大拇哥👍👍'}
+EXCHANGE_STATUS_NAMES = {'pending': '待处理', 'completed': '已完成', 'cancelled': '已取消'}
+
+# 以这些字符开头的单元格会被 Excel 当作公式执行（CSV 公式注入）
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+THUMBS_FIELDS = [
+    'id', 'user_id', 'user_name', 'thumb_type', 'thumb_type_name', 'points',
+    'reason', 'given_by', 'given_by_name', 'created_at'
+]
+EXCHANGE_FIELDS = [
+    'id', 'user_id', 'user_name', 'product_id', 'product_name', 'points_spent',
+    'quantity', 'status', 'status_name', 'remark', 'created_at', 'updated_at'
+]
+
+
+def parse_date_range(start, end):
+    """解析 start/end（YYYY-MM-DD 或 ISO 时间），只给日期时 end 包含当天，格式错误抛 ValueError"""
+    start_at = datetime.fromisoformat(start) if start else None
+    end_at = None
+    if end:
+        end_at = datetime.fromisoformat(end)
+        if len(end) == 10:
+            end_at += timedelta(days=1)
+    return start_at, end_at
+
+
+def _apply_filters(statement, model, user_id, start_at, end_at):
+    if user_id:
+        statement = statement.where(model.user_id == user_id)
+    if start_at:
+        statement = statement.where(model.created_at >= start_at)
+    if end_at:
+        statement = statement.where(model.created_at < end_at)
+    return statement.order_by(model.id)
+
+
+def thumbs_export_statement(user_id=None, start_at=None, end_at=None):
+    """大拇哥记录导出查询（接收人、发放人姓名在同一条 SQL 中关联取出）"""
+    receiver = aliased(User)
+    giver = aliased(User)
+    statement = select(
+        ThumbsRecord.id,
+        ThumbsRecord.user_id,
+        receiver.real_name.label('user_name'),
+        ThumbsRecord.thumb_type,
+        ThumbsRecord.points,
+        ThumbsRecord.reason,
+        ThumbsRecord.given_by,
+        giver.real_name.label('given_by_name'),
+        ThumbsRecord.created_at
+    ).outerjoin(receiver, receiver.id == ThumbsRecord.user_id).outerjoin(giver, giver.id == ThumbsRecord.given_by)
+    return _apply_filters(statement, ThumbsRecord, user_id, start_at, end_at)
+
+
+def exchanges_export_statement(user_id=None, start_at=None, end_at=None, status=None):
+    """兑换记录导出查询"""
+    statement = select(
+        ExchangeRecord.id,
+        ExchangeRecord.user_id,
+        User.real_name.label('user_name'),
+        ExchangeRecord.product_id,
+        ExchangeRecord.product_name,
+        ExchangeRecord.points_spent,
+        ExchangeRecord.quantity,
+        ExchangeRecord.status,
+        ExchangeRecord.remark,
+        ExchangeRecord.created_at,
+        ExchangeRecord.updated_at
+    ).outerjoin(User, User.id == ExchangeRecord.user_id)
+    if status:
+        statement = statement.where(ExchangeRecord.status == status)
+    return _apply_filters(statement, ExchangeRecord, user_id, start_at, end_at)
+
+
+def thumbs_row(row):
+    """导出行，字段与 ThumbsRecord.to_dict 一致"""
+    return {
+        'id': row.id,
+        'user_id': row.user_id,
+        'user_name': row.user_name,
+        'thumb_type': row.thumb_type,
+        'thumb_type_name': THUMB_TYPE_NAMES.get(row.thumb_type),
+        'points': row.points,
+        'reason': row.reason,
+        'given_by': row.given_by,
+        'given_by_name': row.given_by_name,
+        'created_at': _format_time(row.created_at)
+    }
+
+
+def exchange_row(row):
+    """导出行，字段与 ExchangeRecord.to_dict 一致"""
+    return {
+        'id': row.id,
+        'user_id': row.user_id,
+        'user_name': row.user_name,
+        'product_id': row.product_id,
+        'product_name': row.product_name,
+        'points_spent': row.points_spent,
+        'quantity': row.quantity,
+        'status': row.status,
+        'status_name': EXCHANGE_STATUS_NAMES.get(row.status),
+        'remark': row.remark,
+        'created_at': _format_time(row.created_at),
+        'updated_at': _format_time(row.updated_at)
+    }
+
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+def csv_safe(row):
+    """原因、姓名、商品名等用户填写的文本以公式字符开头时前面加 '，Excel 按文本显示而不执行"""
+    return {
+        key: f"'{value}" if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) else value
+        for key, value in row.items()
+    }
+
+
+def stream_export(statement, to_row, fields, fmt, batch_size):
+    """逐批读取并编码，生成响应体片段；CSV 带 BOM 以便 Excel 正确识别中文"""
+    result = db.session.execute(
+        statement,
+        execution_options={'stream_results': True, 'yield_per': batch_size}
+    )
+    try:
+        buffer = io.StringIO()
+        writer = None
+        if fmt == 'csv':
+            writer = csv.DictWriter(buffer, fieldnames=fields)
+            buffer.write('\ufeff')
+            writer.writeheader()
+
+        for rows in result.partitions():
+            for row in rows:
+                if writer:
+                    writer.writerow(csv_safe(to_row(row)))
+                else:
+                    buffer.write(json.dumps(to_row(row), ensure_ascii=False))
+                    buffer.write('\n')
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+    finally:
+        result.close()
@@ -0,0 +1,164 @@
+"""写接口的幂等键
+
+客户端为每次操作生成一个 Idempotency-Key 请求头（如 UUID），网络重试时原样重发：
+- 第一个请求照常处理，成功（2xx）的响应保存在 idempotency_keys 表中；
+- 之后带相同键的请求直接返回保存的响应（响应头 Idempotent-Replayed: true），不会重复兑换或发放；
+- 第一个请求还在处理时，重复请求等待它完成后返回同样的结果，超过 IDEMPOTENCY_WAIT_SECONDS 返回 409；
+- "处理中"的记录超过 IDEMPOTENCY_LEASE_SECONDS 仍无结果时视为第一个请求已中断（进程崩溃等），由重复请求接手重新处理；
+- 同一个键用于不同的请求（路径或请求体不同）返回 422。
+成功的响应由接口在业务写入的同一个事务中保存（commit_response），两者要么一起提交要么一起回滚，
+不会出现已经兑换/发放、键却仍是"处理中"，租期过后被重复执行的情况。
+失败的响应不保存（事务已回滚，没有副作用），可以用同一个键重试。
+键按用户区分，保存 IDEMPOTENCY_TTL 秒，过期记录由 snapshot_points.py 定时清理。
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 64
+
+
+def idempotent(view):
+    """按 Idempotency-Key 请求头去重，放在 @jwt_required() / @admin_required() 之下；不带该请求头时不做处理
+    
+    接口成功时须用 commit_response(response) 代替 db.session.commit() 提交，响应随业务写入一起保存；
+    没有经 commit_response 提交的响应视为失败，释放幂等键。
+    
+    带请求头时多执行 2 条 SQL（占用幂等键、保存响应），接手过期或中断的记录时共 5 条（再加读取、删除、重新占用），
+    接口的 @query_budget 按 5 条预留；重复请求等待第一个请求完成时每次轮询再执行 2 条，如实计入查询预算。
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH or not key.isascii() or not key.isprintable():
+            return jsonify({'code': 400, 'message': f'{HEADER} 格式无效'}), 400
+        
+        user_id = int(get_jwt_identity())
+        fingerprint = request_fingerprint(request.method, request.path, request.get_data())
+        row_id, response = _acquire(user_id, key, fingerprint)
+        if response is not None:
+            return response
+        
+        g.idempotency_row_id = row_id
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except BaseException:
+            db.session.rollback()
+            if not g.get('idempotency_stored'):
+                _release(row_id)
+            raise
+        
+        if not g.get('idempotency_stored'):
+            db.session.rollback()
+            _release(row_id)
+        return response
+    return wrapper
+
+
+def request_fingerprint(method, path, body):
+    """同一个键只能用于方法、路径和请求体都相同的请求"""
+    return hashlib.sha256(method.encode() + b' ' + path.encode() + b'\n' + body).hexdigest()
+
+
+def commit_response(response):
+    """提交当前事务；带幂等键的请求成功（2xx）时把响应写入幂等键记录，与业务写入在同一个事务中提交
+    
+    提交失败时异常照常抛出，事务回滚，幂等键由 @idempotent 释放。返回 response（已转换为响应对象）。
+    """
+    response = current_app.make_response(response)
+    row_id = g.get('idempotency_row_id')
+    store = row_id is not None and 200 <= response.status_code < 300
+    if store:
+        db.session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.id == row_id)
+            .values(status_code=response.status_code, response_body=response.get_data(as_text=True))
+        )
+    db.session.commit()
+    if store:
+        g.idempotency_stored = True
+    return response
+
+
+def _acquire(user_id, key, fingerprint):
+    """占用幂等键，返回 (记录 ID, None)；已有结果或需要拒绝时返回 (None, 响应)"""
+    deadline = time.monotonic() + current_app.config['IDEMPOTENCY_WAIT_SECONDS']
+    delay = 0.02
+    while True:
+        row_id = _claim(user_id, key, fingerprint)
+        if row_id is not None:
+            return row_id, None
+        
+        row = db.session.execute(
+            select(
+                IdempotencyKey.id, IdempotencyKey.request_hash, IdempotencyKey.status_code,
+                IdempotencyKey.response_body, IdempotencyKey.created_at
+            ).where(IdempotencyKey.user_id == user_id, IdempotencyKey.idempotency_key == key)
+        ).first()
+        db.session.rollback()  # 结束读事务，下次轮询才能看到其他连接的提交（REPEATABLE READ）
+        if row is None:
+            continue  # 第一个请求失败后已释放，重新占用
+        now = datetime.utcnow()
+        if row.created_at < now - timedelta(seconds=current_app.config['IDEMPOTENCY_TTL']):
+            _release(row.id)  # 已过期，按新请求处理
+            continue
+        if row.request_hash != fingerprint:
+            return None, (jsonify({'code': 422, 'message': f'{HEADER} 已用于其他请求'}), 422)
+        if row.status_code is not None:
+            response = current_app.response_class(row.response_body, status=row.status_code, mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return None, response
+        if row.created_at < now - timedelta(seconds=current_app.config['IDEMPOTENCY_LEASE_SECONDS']):
+            _reclaim(row.id)  # 第一个请求已中断，删除后重新占用
+            continue
+        if time.monotonic() >= deadline:
+            response = jsonify({'code': 409, 'message': '相同的请求正在处理中，请稍后重试'})
+            response.headers['Retry-After'] = '1'
+            return None, (response, 409)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.2)
+
+
+def _claim(user_id, key, fingerprint):
+    """插入"处理中"的记录并立即提交，唯一索引冲突时返回 None"""
+    try:
+        result = db.session.execute(
+            insert(IdempotencyKey).values(
+                user_id=user_id, idempotency_key=key, request_hash=fingerprint, created_at=datetime.utcnow()
+            )
+        )
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return result.inserted_primary_key[0]
+
+
+def _release(row_id):
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id == row_id))
+    db.session.commit()
+
+
+def _reclaim(row_id):
+    """删除超过租期仍无结果的记录；只删仍处于"处理中"的，多个重复请求同时接手时只有一个能重新占用"""
+    db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.id == row_id, IdempotencyKey.status_code.is_(None))
+    )
+    db.session.commit()
+
+
+def purge_expired():
+    """删除过期的幂等键，返回删除条数"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['IDEMPOTENCY_TTL'])
+    result = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+    db.session.commit()
+    return result.rowcount
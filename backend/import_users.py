@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量导入用户名单
+名单为 CSV（表头: username,real_name,email,phone,role,password）或 JSON 用户数组。
+
+先预览差异，确认后再正式导入:
+    python import_users.py roster.csv --default-password 123456 --dry-run
+    python import_users.py roster.csv --default-password 123456
+按 HR 名单同步（更新已有用户资料，停用名单中没有的普通用户）:
+    python import_users.py roster.csv --sync --deactivate-missing
+"""
+
+import argparse
+import os
+from app import app
+import user_import
+
+
+def print_report(report):
+    for username in report['created']:
+        print(f"  + 新建 {username}")
+    for item in report['updated']:
+        print(f"  ~ 更新 {item['username']}: {item['changes']}")
+    for username in report['deactivated']:
+        print(f"  - 停用 {username}")
+    for error in report['errors']:
+        print(f"  ! 第 {error.get('line', '-')} 行 {error['username'] or ''}: {error['message']}")
+    print(
+        f"新建 {len(report['created'])}，更新 {len(report['updated'])}，停用 {len(report['deactivated'])}，"
+        f"无变化 {report['unchanged_count']}，错误 {len(report['errors'])}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量导入用户名单')
+    parser.add_argument('file', help='名单文件（.csv 或 .json）')
+    parser.add_argument('--sync', action='store_true', help='更新已有用户的姓名、邮箱和电话')
+    parser.add_argument('--deactivate-missing', action='store_true', help='与 --sync 一起使用，停用名单中没有的普通用户')
+    parser.add_argument(
+        '--default-password', default=os.getenv('IMPORT_DEFAULT_PASSWORD'),
+        help='名单未提供密码时使用的初始密码（也可通过环境变量 IMPORT_DEFAULT_PASSWORD 传入）'
+    )
+    parser.add_argument('--dry-run', action='store_true', help='只显示差异，不写入数据库')
+    args = parser.parse_args()
+    
+    fmt = os.path.splitext(args.file)[1].lstrip('.').lower()
+    with open(args.file, 'rb') as f:
+        rows = user_import.parse_roster(f.read(), fmt)
+    
+    with app.app_context():
+        plan = user_import.plan_import(
+            rows,
+            sync=args.sync,
+            deactivate_missing=args.deactivate_missing,
+            default_password=args.default_password
+        )
+        print_report(user_import.import_report(plan, args.dry_run))
+        
+        if args.dry_run:
+            print("\n[√] 预览完成，未写入数据")
+        elif plan['errors']:
+            print("\n[×] 名单有错误，未导入任何用户")
+        else:
+            user_import.apply_import(plan, chunk_size=app.config['USER_IMPORT_CHUNK_SIZE'])
+            print("\n[√] 导入完成")
+
+
+if __name__ == '__main__':
+    print("=" * 50)
+    print("批量导入用户")
+    print("=" * 50)
+    
+    try:
+        main()
+    except Exception as e:
+        print(f"\n[×] 错误: {e}")
+        print("\n请确保：")
+        print("1. 数据库连接配置正确")
+        print("2. 名单文件为 UTF-8 编码的 CSV 或 JSON")
@@ -0,0 +1,157 @@
+"""积分排行榜
+
+每个 worker 进程为总榜、周榜、月榜各维护一份按积分有序的列表，首次访问时从数据库载入，
+发放大拇哥后原地更新，查询前 N 名和"我的名次"都是二分查找，不再对 users 表排序和 COUNT。
+其他 worker 发放的积分在 LEADERBOARD_REFRESH 秒后随重新载入同步；周/月切换时也会重新载入。
+只统计启用中的普通用户，积分为 0 的用户不入榜，名次并列时按"积分更高的人数 + 1"计算。
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import db, User, ThumbsRecord
+
+WINDOWS = ('all', 'week', 'month')
+
+
+def window_start(window, now=None):
+    """榜单统计起点（UTC，与 created_at 一致）：周榜从周一零点，月榜从当月 1 日零点，总榜为 None"""
+    now = now or datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == 'week':
+        return today - timedelta(days=today.weekday())
+    if window == 'month':
+        return today.replace(day=1)
+    return None
+
+
+class RankingBoard:
+    """按积分降序排列的用户列表，元素为 (-points, user_id)"""
+    
+    def __init__(self, rows=()):
+        self._points = {}
+        self._keys = []
+        for user_id, points in rows:
+            points = int(points or 0)
+            if points > 0:
+                self._points[user_id] = points
+                self._keys.append((-points, user_id))
+        self._keys.sort()
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def add(self, user_id, delta):
+        """给用户加分"""
+        old = self._points.get(user_id, 0)
+        if old > 0:
+            del self._keys[bisect_left(self._keys, (-old, user_id))]
+        points = old + delta
+        if points > 0:
+            self._points[user_id] = points
+            insort(self._keys, (-points, user_id))
+        else:
+            self._points.pop(user_id, None)
+    
+    def top(self, limit):
+        """前 limit 名 [(rank, user_id, points)]"""
+        result = []
+        for index, (negative_points, user_id) in enumerate(self._keys[:limit]):
+            rank = index + 1
+            if result and result[-1][2] == -negative_points:
+                rank = result[-1][0]
+            result.append((rank, user_id, -negative_points))
+        return result
+    
+    def rank(self, user_id):
+        """(名次, 积分)，不在榜上返回 (None, 0)"""
+        points = self._points.get(user_id, 0)
+        if points <= 0:
+            return None, 0
+        return bisect_left(self._keys, (-points,)) + 1, points
+
+
+class Leaderboard:
+    """各时间窗口排行榜的进程内缓存"""
+    
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.loads = 0
+        self._boards = {}
+        self._loading = {}  # 正在载入的窗口 -> (统计起点, 载入期间 record() 的积分 [{user_id: 积分}])
+        self._generation = 0  # invalidate() 时加一，载入期间被失效的结果不再发布
+        self._lock = threading.Lock()
+        self._loaded = threading.Condition(self._lock)
+    
+    def snapshot(self, window, user_id, limit):
+        """返回 (统计起点, 前 limit 名, (我的名次, 我的积分), 上榜人数)"""
+        since, board = self._get_board(window)
+        with self._lock:
+            return since, board.top(limit), board.rank(user_id), len(board)
+    
+    def record(self, points_by_user):
+        """发放大拇哥提交后调用，points_by_user 为 {user_id: 新增积分}"""
+        with self._lock:
+            for window, (since, board, expires_at) in self._boards.items():
+                if window_start(window) != since:
+                    continue
+                for user_id, points in points_by_user.items():
+                    board.add(user_id, points)
+            # 正在载入的榜单可能读不到这次发放，先记下，载入完成后补上
+            for window, (since, pending) in self._loading.items():
+                if window_start(window) == since:
+                    pending.append(dict(points_by_user))
+    
+    def invalidate(self):
+        """丢弃全部榜单，下次访问时重新载入"""
+        with self._lock:
+            self._generation += 1
+            self._boards.clear()
+    
+    def _get_board(self, window):
+        """取窗口的榜单，过期时重新载入
+        
+        载入在锁外执行，同一窗口同一时间只有一个线程在载入，其他线程继续使用旧榜单（没有旧榜单时等待），
+        不会因为一次载入挡住所有窗口的查询和 record()。载入期间 record() 的积分记在 pending 中，
+        发布前补到新榜单上；恰好在发放提交后、record() 前开始的载入会多计一次，下次重新载入时纠正。
+        """
+        with self._lock:
+            while True:
+                since = window_start(window)
+                cached = self._boards.get(window)
+                if cached and (window in self._loading or (cached[0] == since and time.monotonic() < cached[2])):
+                    return cached[0], cached[1]
+                if window not in self._loading:
+                    break
+                self._loaded.wait()
+            pending = []
+            self._loading[window] = (since, pending)
+            generation = self._generation
+        
+        board = None
+        try:
+            board = RankingBoard(self._load(since))
+        finally:
+            with self._lock:
+                del self._loading[window]
+                if board is not None:
+                    for points_by_user in pending:
+                        for user_id, points in points_by_user.items():
+                            board.add(user_id, points)
+                if board is not None and generation == self._generation:
+                    self._boards[window] = (since, board, time.monotonic() + self.ttl)
+                    self.loads += 1
+                self._loaded.notify_all()
+        return since, board
+    
+    def _load(self, since):
+        if since is None:
+            return db.session.query(User.id, User.total_points).filter(
+                User.role == 'user', User.is_active.is_(True), User.total_points > 0
+            ).all()
+        return db.session.query(ThumbsRecord.user_id, func.sum(ThumbsRecord.points)).join(
+            User, User.id == ThumbsRecord.user_id
+        ).filter(
+            ThumbsRecord.created_at >= since, User.role == 'user', User.is_active.is_(True)
+        ).group_by(ThumbsRecord.user_id).all()
@@ -0,0 +1,238 @@
+"""积分流水
+
+每次积分变动都追加一条流水（获得 credit、兑换 debit、取消退回 refund），与业务记录在同一事务中写入。
+snapshot_points.py 定期为每个用户生成快照，任意时刻的余额 = 该时刻之前最近的快照 + 其后的少量流水。
+users 表上的 total_points / available_points 只是流水的汇总缓存，可随时用 rebuild_balances() 重算。
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import and_, exists, func, insert, literal, select, update
+from sqlalchemy.orm import aliased
+from models import db, User, ThumbsRecord, PointsLedger, PointsSnapshot
+
+# 快照只包含写入超过该秒数的流水，需远大于最长的事务时间
+SNAPSHOT_SETTLE_SECONDS = 10 * 60
+
+
+def credit_thumbs(record):
+    """发放大拇哥：总积分和可用积分同时增加"""
+    db.session.add(PointsLedger(
+        user_id=record.user_id,
+        entry_type='credit',
+        total_delta=record.points,
+        available_delta=record.points,
+        source_type='thumbs',
+        source_id=record.id
+    ))
+
+
+def credit_thumbs_batch(after_id, given_by):
+    """为批量插入的大拇哥记录补写流水
+    
+    after_id 为插入前的最大记录 ID。其他事务提交的记录都已带有流水，
+    所以 ID 更大、由该管理员发放且没有流水的记录就是本事务刚插入的。
+    先用普通 SELECT（一致性读，不加锁）取出这些记录再批量插入流水；
+    不用 INSERT ... SELECT，它会对读到的范围加共享锁，同一管理员的两个并发批量发放会互相等待对方未提交的记录而死锁。
+    """
+    has_entry = exists().where(and_(
+        PointsLedger.source_type == 'thumbs',
+        PointsLedger.source_id == ThumbsRecord.id
+    ))
+    records = db.session.execute(select(
+        ThumbsRecord.id, ThumbsRecord.user_id, ThumbsRecord.points, ThumbsRecord.created_at
+    ).where(
+        ThumbsRecord.id > after_id,
+        ThumbsRecord.given_by == given_by,
+        ~has_entry
+    )).all()
+    if records:
+        db.session.execute(insert(PointsLedger), [
+            {
+                'user_id': record.user_id,
+                'entry_type': 'credit',
+                'total_delta': record.points,
+                'available_delta': record.points,
+                'source_type': 'thumbs',
+                'source_id': record.id,
+                'created_at': record.created_at
+            }
+            for record in records
+        ])
+
+
+def debit_exchange(record):
+    """兑换：扣减可用积分"""
+    db.session.add(PointsLedger(
+        user_id=record.user_id,
+        entry_type='debit',
+        total_delta=0,
+        available_delta=-record.points_spent,
+        source_type='exchange',
+        source_id=record.id
+    ))
+
+
+def refund_exchange(record):
+    """取消兑换：退回可用积分"""
+    db.session.add(PointsLedger(
+        user_id=record.user_id,
+        entry_type='refund',
+        total_delta=0,
+        available_delta=record.points_spent,
+        source_type='exchange',
+        source_id=record.id
+    ))
+
+
+def balance_at(user_id, at=None):
+    """计算用户在 at 时刻（默认当前）的积分：最近快照 + 其后流水"""
+    snapshot_query = PointsSnapshot.query.filter_by(user_id=user_id)
+    if at is not None:
+        snapshot_query = snapshot_query.filter(PointsSnapshot.created_at <= at)
+    snapshot = snapshot_query.order_by(PointsSnapshot.ledger_id.desc()).first()
+    
+    tail_query = db.session.query(
+        func.coalesce(func.sum(PointsLedger.total_delta), 0),
+        func.coalesce(func.sum(PointsLedger.available_delta), 0)
+    ).filter(PointsLedger.user_id == user_id)
+    if snapshot:
+        tail_query = tail_query.filter(PointsLedger.id > snapshot.ledger_id)
+    if at is not None:
+        tail_query = tail_query.filter(PointsLedger.created_at <= at)
+    total_delta, available_delta = tail_query.one()
+    
+    return {
+        'total_points': (snapshot.total_points if snapshot else 0) + int(total_delta),
+        'available_points': (snapshot.available_points if snapshot else 0) + int(available_delta),
+        'snapshot_ledger_id': snapshot.ledger_id if snapshot else None
+    }
+
+
+def _latest_snapshot_ledger_ids():
+    """每个用户最近快照对应的流水 ID"""
+    return select(
+        PointsSnapshot.user_id,
+        func.max(PointsSnapshot.ledger_id).label('ledger_id')
+    ).group_by(PointsSnapshot.user_id).subquery()
+
+
+def _snapshot_horizon():
+    """快照可以包含的最大流水 ID
+    
+    自增 ID 在插入时分配、事务提交时才可见，直接取 MAX(id) 时仍在进行的事务可能在之后提交一条更小 ID 的流水，
+    而 balance_at 只累加快照 ledger_id 之后的流水，这条流水就永远算不进余额。
+    所以只快照 SNAPSHOT_SETTLE_SECONDS 之前写入的流水（届时相关事务早已结束），
+    并且不越过第一条更晚写入的流水。
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=SNAPSHOT_SETTLE_SECONDS)
+    upto = db.session.query(func.max(PointsLedger.id)).filter(PointsLedger.created_at <= cutoff).scalar()
+    first_recent = db.session.query(func.min(PointsLedger.id)).filter(PointsLedger.created_at > cutoff).scalar()
+    if upto and first_recent:
+        upto = min(upto, first_recent - 1)
+    return upto
+
+
+def take_snapshots():
+    """为自上次快照后有新流水的用户生成快照，返回生成数量"""
+    upto = _snapshot_horizon()
+    if not upto:
+        return 0
+    
+    latest = _latest_snapshot_ledger_ids()
+    
+    # 各用户上一次快照的余额
+    previous = {
+        snapshot.user_id: snapshot
+        for snapshot in PointsSnapshot.query.join(
+            latest,
+            and_(PointsSnapshot.user_id == latest.c.user_id, PointsSnapshot.ledger_id == latest.c.ledger_id)
+        )
+    }
+    
+    # 上次快照之后、upto 之前的流水汇总
+    tails = db.session.query(
+        PointsLedger.user_id,
+        func.sum(PointsLedger.total_delta),
+        func.sum(PointsLedger.available_delta),
+        func.max(PointsLedger.id)
+    ).outerjoin(latest, PointsLedger.user_id == latest.c.user_id).filter(
+        PointsLedger.id > func.coalesce(latest.c.ledger_id, 0),
+        PointsLedger.id <= upto
+    ).group_by(PointsLedger.user_id).all()
+    
+    now = datetime.utcnow()
+    rows = []
+    for user_id, total_delta, available_delta, last_id in tails:
+        snapshot = previous.get(user_id)
+        rows.append({
+            'user_id': user_id,
+            'ledger_id': last_id,
+            'total_points': (snapshot.total_points if snapshot else 0) + int(total_delta),
+            'available_points': (snapshot.available_points if snapshot else 0) + int(available_delta),
+            'created_at': now
+        })
+    
+    if rows:
+        db.session.execute(insert(PointsSnapshot), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def rebuild_balances():
+    """用快照 + 流水重算 users 表上的积分缓存，返回更新的用户数"""
+    latest = aliased(PointsSnapshot)
+    latest_ledger_id = select(func.max(latest.ledger_id)).where(
+        latest.user_id == User.id
+    ).correlate(User).scalar_subquery()
+    
+    def snapshot_value(column):
+        return func.coalesce(select(column).where(
+            PointsSnapshot.user_id == User.id,
+            PointsSnapshot.ledger_id == latest_ledger_id
+        ).correlate(User).limit(1).scalar_subquery(), 0)
+    
+    def tail_sum(column):
+        return select(func.coalesce(func.sum(column), 0)).where(
+            PointsLedger.user_id == User.id,
+            PointsLedger.id > func.coalesce(latest_ledger_id, 0)
+        ).correlate(User).scalar_subquery()
+    
+    result = db.session.execute(
+        update(User).values(
+            total_points=snapshot_value(PointsSnapshot.total_points) + tail_sum(PointsLedger.total_delta),
+            available_points=snapshot_value(PointsSnapshot.available_points) + tail_sum(PointsLedger.available_delta)
+        ).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def open_balances():
+    """写入期初余额：为还没有期初流水的用户补一条，返回写入数量
+    
+    期初 = users 表当前余额 - 已有流水合计。流水代码上线后、执行 --open 前已有发放或兑换的用户，
+    期初只补上线前的存量，与之后的流水合计正好等于当前余额。可重复执行，已有期初流水的用户跳过。
+    """
+    has_opening = exists().where(PointsLedger.user_id == User.id, PointsLedger.entry_type == 'opening')
+    
+    def ledger_sum(column):
+        return select(func.coalesce(func.sum(column), 0)).where(
+            PointsLedger.user_id == User.id
+        ).correlate(User).scalar_subquery()
+    
+    total_delta = User.total_points - ledger_sum(PointsLedger.total_delta)
+    available_delta = User.available_points - ledger_sum(PointsLedger.available_delta)
+    rows = select(
+        User.id,
+        literal('opening'),
+        total_delta,
+        available_delta
+    ).where(
+        ~has_opening,
+        (total_delta != 0) | (available_delta != 0)
+    )
+    result = db.session.execute(insert(PointsLedger).from_select(
+        ['user_id', 'entry_type', 'total_delta', 'available_delta'],
+        rows
+    ))
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,207 @@
+"""请求指标（Prometheus 文本格式，由 GET /metrics 输出）
+
+按接口（Flask endpoint）统计：
+- numbmall_http_request_duration_seconds  请求耗时直方图
+- numbmall_http_requests_total            按状态码计数
+- numbmall_http_requests_in_flight        正在处理的请求数
+- numbmall_http_request_db_queries        每个请求执行的 SQL 条数直方图
+- numbmall_db_query_duration_seconds_total  SQL 累计耗时（由 sql_profiler.py 计时）
+另附主库连接池的几个指标（见 pool_metrics.py）。
+
+每个请求只做几次计时和一次加锁累加，可在生产环境常开。指标只统计当前 worker 进程，
+多进程部署时 Prometheus 需分别抓取各进程，或把各进程的指标按 instance 汇总。
+"""
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+from flask import g, request
+from pool_metrics import pool_metrics
+from rate_limit import limiter
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+# 未匹配到路由的请求（404 扫描等）归为一类，避免标签数量失控
+UNMATCHED = 'unmatched'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestMetrics:
+    """按接口汇总的请求计数器"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.in_flight = defaultdict(int)
+        self.requests = defaultdict(int)
+        self.latency = {}
+        self.db_queries = {}
+        self.db_seconds = defaultdict(float)
+    
+    def request_started(self, endpoint):
+        with self._lock:
+            self.in_flight[endpoint] += 1
+    
+    def request_cancelled(self, endpoint):
+        """已计入 in-flight 但转交他处处理的请求"""
+        with self._lock:
+            self.in_flight[endpoint] -= 1
+    
+    def request_finished(self, endpoint, method, status, seconds, queries=None, query_seconds=0.0):
+        """queries 为 None 时不统计 SQL（ASGI 异步接口）"""
+        with self._lock:
+            self.in_flight[endpoint] -= 1
+            self.requests[(endpoint, method, status)] += 1
+            key = (endpoint, method)
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.latency[key].observe(seconds)
+            if queries is not None:
+                if endpoint not in self.db_queries:
+                    self.db_queries[endpoint] = Histogram(QUERY_BUCKETS)
+                self.db_queries[endpoint].observe(queries)
+                self.db_seconds[endpoint] += query_seconds
+    
+    def render(self):
+        """Prometheus 文本格式"""
+        with self._lock:
+            lines = [
+                '# HELP numbmall_http_request_duration_seconds Request latency by endpoint.',
+                '# TYPE numbmall_http_request_duration_seconds histogram',
+            ]
+            for (endpoint, method), histogram in sorted(self.latency.items()):
+                labels = f'endpoint="{_label(endpoint)}",method="{method}"'
+                lines.extend(histogram.render('numbmall_http_request_duration_seconds', labels))
+            
+            lines += [
+                '# HELP numbmall_http_requests_total Requests by endpoint and status code.',
+                '# TYPE numbmall_http_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'numbmall_http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} {count}'
+                )
+            
+            lines += [
+                '# HELP numbmall_http_requests_in_flight Requests currently being handled.',
+                '# TYPE numbmall_http_requests_in_flight gauge',
+            ]
+            for endpoint, count in sorted(self.in_flight.items()):
+                lines.append(f'numbmall_http_requests_in_flight{{endpoint="{_label(endpoint)}"}} {count}')
+            
+            lines += [
+                '# HELP numbmall_http_request_db_queries SQL statements executed per request.',
+                '# TYPE numbmall_http_request_db_queries histogram',
+            ]
+            for endpoint, histogram in sorted(self.db_queries.items()):
+                lines.extend(histogram.render('numbmall_http_request_db_queries', f'endpoint="{_label(endpoint)}"'))
+            
+            lines += [
+                '# HELP numbmall_db_query_duration_seconds_total Time spent executing SQL by endpoint.',
+                '# TYPE numbmall_db_query_duration_seconds_total counter',
+            ]
+            for endpoint, seconds in sorted(self.db_seconds.items()):
+                lines.append(f'numbmall_db_query_duration_seconds_total{{endpoint="{_label(endpoint)}"}} {seconds:.6f}')
+        
+        lines += _pool_lines()
+        lines += _rate_limit_lines()
+        lines += [
+            '# HELP numbmall_process_start_time_seconds Worker start time.',
+            '# TYPE numbmall_process_start_time_seconds gauge',
+            f'numbmall_process_start_time_seconds{{pid="{os.getpid()}"}} {self.started_at:.3f}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def _pool_lines():
+    pool = pool_metrics.pool
+    if pool is None:
+        return []
+    gauges = [
+        ('db_pool_checked_out', 'gauge', 'Connections currently checked out.', pool.checkedout()),
+        ('db_pool_idle', 'gauge', 'Idle connections in the pool.', pool.checkedin()),
+        ('db_pool_overflow', 'gauge', 'Overflow connections in use.', max(pool.overflow(), 0)),
+        ('db_pool_checkouts_total', 'counter', 'Connection checkouts.', pool_metrics.checkouts),
+        ('db_pool_timeouts_total', 'counter', 'Checkouts that timed out waiting.', pool_metrics.timeouts),
+        ('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.', round(pool_metrics.wait_total, 6)),
+    ]
+    lines = []
+    for name, kind, description, value in gauges:
+        lines += [f'# HELP numbmall_{name} {description}', f'# TYPE numbmall_{name} {kind}', f'numbmall_{name} {value}']
+    return lines
+
+
+def _rate_limit_lines():
+    stats = limiter.stats()
+    lines = [
+        '# HELP numbmall_rate_limited_total Requests rejected with 429 by limit.',
+        '# TYPE numbmall_rate_limited_total counter',
+    ]
+    for setting, count in sorted(stats['rejected'].items()):
+        lines.append(f'numbmall_rate_limited_total{{limit="{setting}"}} {count}')
+    lines += [
+        '# HELP numbmall_load_shed_total Requests rejected with 503 because too many were in flight.',
+        '# TYPE numbmall_load_shed_total counter',
+        f'numbmall_load_shed_total {stats["shed"]}',
+    ]
+    return lines
+
+
+request_metrics = RequestMetrics()
+
+
+def init_metrics(app):
+    """注册请求计时钩子（SQL 条数取自 query_budget 的 g.query_count，耗时取自 sql_profiler 的 g.query_seconds）"""
+    
+    @app.before_request
+    def start_request_timer():
+        g.metrics_endpoint = request.endpoint or UNMATCHED
+        g.metrics_started = time.perf_counter()
+        request_metrics.request_started(g.metrics_endpoint)
+    
+    @app.after_request
+    def record_response_status(response):
+        g.metrics_status = response.status_code
+        return response
+    
+    @app.teardown_request
+    def record_request(exception=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        request_metrics.request_finished(
+            g.metrics_endpoint,
+            request.method,
+            g.get('metrics_status', 500),
+            time.perf_counter() - started,
+            g.get('query_count', 0),
+            g.get('query_seconds', 0.0)
+        )
@@ -1,12 +1,19 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hasher
+from uploads import variant_urls
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     """用户模型"""
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('idx_users_created_id', 'created_at', 'id'),
+        db.Index('idx_users_real_name', 'real_name'),
+        db.Index('ft_users_name', 'username', 'real_name', mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
@@ -17,6 +24,14 @@ class User(db.Model):
     role = db.Column(db.Enum('admin', 'user'), default='user')
     total_points = db.Column(db.Integer, default=0)
     available_points = db.Column(db.Integer, default=0)
+    # 统计计数，与 give_thumbs / create_exchange / cancel_exchange 同事务更新，可用 rebuild_counters.py 重建
+    single_thumbs = db.Column(db.Integer, default=0, nullable=False)
+    double_thumbs = db.Column(db.Integer, default=0, nullable=False)
+    total_exchanges = db.Column(db.Integer, default=0, nullable=False)
+    # 令牌版本，修改/重置密码时加一，使旧令牌失效
+    token_version = db.Column(db.Integer, default=0, nullable=False)
+    # 停用后不能登录，已签发的令牌随 token_version 加一失效（名单同步时自动停用离职人员）
+    is_active = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -25,12 +40,16 @@ class User(db.Model):
     exchange_records = db.relationship('ExchangeRecord', backref='user', lazy='dynamic')
     
     def set_password(self, password):
-        """设置密码"""
-        self.password = generate_password_hash(password)
+        """设置密码（在哈希线程池中计算）"""
+        self.password = hasher.hash(password)
     
     def check_password(self, password):
         """验证密码"""
-        return check_password_hash(self.password, password)
+        return hasher.verify(self.password, password)
+    
+    def password_needs_rehash(self):
+        """哈希算法或迭代次数已调整，需要用明文重新哈希"""
+        return hasher.needs_rehash(self.password)
     
     def to_dict(self):
         """转换为字典"""
@@ -43,6 +62,7 @@ class User(db.Model):
             'role': self.role,
             'total_points': self.total_points,
             'available_points': self.available_points,
+            'is_active': self.is_active,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
         }
 
@@ -50,6 +70,10 @@ class User(db.Model):
 class ThumbsRecord(db.Model):
     """大拇哥记录模型"""
     __tablename__ = 'thumbs_records'
+    __table_args__ = (
+        db.Index('idx_thumbs_created_id', 'created_at', 'id'),
+        db.Index('idx_thumbs_user_created_id', 'user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -62,18 +86,27 @@ class ThumbsRecord(db.Model):
     # 关系
     giver = db.relationship('User', foreign_keys=[given_by])
     
-    def to_dict(self):
-        """转换为字典"""
+    def to_dict(self, user_names=None):
+        """转换为字典
+
+        user_names: 列表接口批量预取的 {user_id: real_name}，传入时不再逐条懒加载 user/giver
+        """
+        if user_names is not None:
+            user_name = user_names.get(self.user_id)
+            given_by_name = user_names.get(self.given_by)
+        else:
+            user_name = self.user.real_name if self.user else None
+            given_by_name = self.giver.real_name if self.giver else None
         return {
             'id': self.id,
             'user_id': self.user_id,
-            'user_name': self.user.real_name if self.user else None,
+            'user_name': user_name,
             'thumb_type': self.thumb_type,
             'thumb_type_name': '单大拇哥👍' if self.thumb_type == 'single' else '双大拇哥👍👍',
             'points': self.points,
             'reason': self.reason,
             'given_by': self.given_by,
-            'given_by_name': self.giver.real_name if self.giver else None,
+            'given_by_name': given_by_name,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
         }
 
@@ -81,6 +114,9 @@ class ThumbsRecord(db.Model):
 class Product(db.Model):
     """商品模型"""
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ft_products_name', 'name', mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -103,6 +139,7 @@ class Product(db.Model):
             'name': self.name,
             'description': self.description,
             'image_url': self.image_url,
+            'image_variants': variant_urls(self.image_url),
             'points_required': self.points_required,
             'stock': self.stock,
             'status': self.status,
@@ -116,6 +153,10 @@ class Product(db.Model):
 class ExchangeRecord(db.Model):
     """兑换记录模型"""
     __tablename__ = 'exchange_records'
+    __table_args__ = (
+        db.Index('idx_exchange_created_id', 'created_at', 'id'),
+        db.Index('idx_exchange_user_created_id', 'user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -128,12 +169,19 @@ class ExchangeRecord(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
-        """转换为字典"""
+    def to_dict(self, user_names=None):
+        """转换为字典
+
+        user_names: 列表接口批量预取的 {user_id: real_name}，传入时不再懒加载 user
+        """
+        if user_names is not None:
+            user_name = user_names.get(self.user_id)
+        else:
+            user_name = self.user.real_name if self.user else None
         return {
             'id': self.id,
             'user_id': self.user_id,
-            'user_name': self.user.real_name if self.user else None,
+            'user_name': user_name,
             'product_id': self.product_id,
             'product_name': self.product_name,
             'points_spent': self.points_spent,
@@ -147,3 +195,67 @@ class ExchangeRecord(db.Model):
 
 
 
+
+
+class PointsLedger(db.Model):
+    """积分流水模型（只追加，不修改）"""
+    __tablename__ = 'points_ledger'
+    __table_args__ = (
+        db.Index('idx_ledger_user_id', 'user_id', 'id'),
+        db.Index('idx_ledger_source', 'source_type', 'source_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    entry_type = db.Column(db.Enum('opening', 'credit', 'debit', 'refund'), nullable=False)
+    total_delta = db.Column(db.Integer, nullable=False, default=0)
+    available_delta = db.Column(db.Integer, nullable=False, default=0)
+    source_type = db.Column(db.Enum('thumbs', 'exchange'))
+    source_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'entry_type': self.entry_type,
+            'entry_type_name': {'opening': '期初余额', 'credit': '获得', 'debit': '兑换', 'refund': '退回'}.get(self.entry_type),
+            'total_delta': self.total_delta,
+            'available_delta': self.available_delta,
+            'source_type': self.source_type,
+            'source_id': self.source_id,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
+        }
+
+
+class PointsSnapshot(db.Model):
+    """积分快照模型：截至 ledger_id（含）的累计余额"""
+    __tablename__ = 'points_snapshots'
+    __table_args__ = (
+        db.Index('idx_snapshot_user_ledger', 'user_id', 'ledger_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    ledger_id = db.Column(db.Integer, nullable=False)
+    total_points = db.Column(db.Integer, nullable=False)
+    available_points = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class IdempotencyKey(db.Model):
+    """幂等键模型：写接口已处理请求的响应（status_code 为空表示正在处理）"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uk_idempotency_user_key'),
+        db.Index('idx_idempotency_created', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    idempotency_key = db.Column(db.String(64), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text(16777215))  # MySQL 中为 MEDIUMTEXT，批量发放的结果可能超过 64KB
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,77 @@
+"""游标（keyset）分页
+
+按 (created_at, id) 倒序翻页，下一页条件为 "(created_at, id) 小于上一页最后一条"，
+配合 (created_at, id) 复合索引，翻到多深都只扫描 per_page + 1 行，且默认不再执行 COUNT(*)。
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+MAX_PER_PAGE = 100
+
+
+def encode_cursor(record):
+    """把记录的 (created_at, id) 编码为不透明游标"""
+    raw = f'{record.created_at.isoformat()}|{record.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, record_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError('分页游标无效') from e
+
+
+def keyset_condition(model, cursor):
+    """游标对应的翻页条件：(created_at, id) 小于上一页最后一条"""
+    created_at, last_id = decode_cursor(cursor)
+    return or_(
+        model.created_at < created_at,
+        and_(model.created_at == created_at, model.id < last_id)
+    )
+
+
+def keyset_order(model):
+    """游标分页的排序"""
+    return model.created_at.desc(), model.id.desc()
+
+
+def clamp_per_page(per_page):
+    """游标分页每页条数限制在 1 ~ MAX_PER_PAGE"""
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def split_page(items, per_page):
+    """多取的一条用于判断是否还有下一页，返回 (本页记录, 下一页游标)"""
+    if len(items) > per_page:
+        items = items[:per_page]
+        return items, encode_cursor(items[-1])
+    return items, None
+
+
+def keyset_page(query, model, cursor, per_page, serialize, with_total=False):
+    """游标分页，返回响应 data 字典
+
+    cursor 为空字符串表示第一页；with_total 为真时才额外统计总数。
+    """
+    per_page = clamp_per_page(per_page)
+    total = None
+    if with_total:
+        total = query.order_by(None).count()
+    
+    if cursor:
+        query = query.filter(keyset_condition(model, cursor))
+    
+    items = query.order_by(*keyset_order(model)).limit(per_page + 1).all()
+    items, next_cursor = split_page(items, per_page)
+    
+    return {
+        'list': serialize(items),
+        'next_cursor': next_cursor,
+        'total': total,
+        'per_page': per_page
+    }
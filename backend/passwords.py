@@ -0,0 +1,126 @@
+"""密码哈希线程池
+
+PBKDF2 是 CPU 密集运算（hashlib 计算时会释放 GIL），集中登录时会占满所有请求线程的 CPU。
+这里把哈希和校验交给固定大小的线程池执行，同时进行的哈希数量不超过 PASSWORD_HASH_WORKERS，
+排队数超过 PASSWORD_HASH_QUEUE_LIMIT 时直接拒绝（返回 503），不再无限排队。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """哈希线程池排队已满或等待超时"""
+
+
+class PasswordHasher:
+    """有界的密码哈希线程池，未初始化时在当前线程同步计算"""
+    
+    def __init__(self):
+        self.method = 'pbkdf2:sha256:600000'
+        self.max_queue = 0
+        self.timeout = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = None
+        self._workers = 0
+        self._method_prefix = None
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self._method_prefix = None
+        self.max_queue = app.config['PASSWORD_HASH_QUEUE_LIMIT']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self._workers = app.config['PASSWORD_HASH_WORKERS']
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='password-hash')
+    
+    def hash(self, password):
+        """按当前配置的算法和迭代次数生成哈希"""
+        return self._run(generate_password_hash, password, self.method)
+    
+    def verify(self, password_hash, password):
+        """校验密码"""
+        return self._run(check_password_hash, password_hash, password)
+    
+    def hash_many(self, passwords):
+        """批量哈希（如导入用户），最多占用一半线程，其余留给登录请求；不受排队上限限制"""
+        if self._executor is None:
+            return [generate_password_hash(password, self.method) for password in passwords]
+        
+        passwords = list(passwords)
+        step = max(self._workers // 2, 1)
+        hashes = []
+        for start in range(0, len(passwords), step):
+            chunk = passwords[start:start + step]
+            with self._lock:
+                self.pending += len(chunk)
+            try:
+                futures = [self._executor.submit(generate_password_hash, password, self.method) for password in chunk]
+                hashes.extend(future.result() for future in futures)
+            finally:
+                with self._lock:
+                    self.pending -= len(chunk)
+            with self._lock:
+                self.completed += len(chunk)
+        return hashes
+    
+    def needs_rehash(self, password_hash):
+        """已存哈希的算法参数（如 pbkdf2:sha256:600000）与当前配置不同时需要重新哈希"""
+        return password_hash.split('$', 1)[0] != self.method_prefix()
+    
+    def method_prefix(self):
+        """当前配置生成的哈希前缀
+
+        配置可以省略迭代次数（如 pbkdf2 或 pbkdf2:sha256），直接比较配置字符串会让每次登录都重新哈希，
+        所以用当前配置哈希一次空密码，取 werkzeug 补全后的前缀（结果缓存）。
+        """
+        if self._method_prefix is None:
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._method_prefix
+    
+    def stats(self):
+        """线程池状态：pending 为正在计算和排队中的任务数"""
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self._workers,
+                'pending': self.pending,
+                'queue_depth': max(self.pending - self._workers, 0),
+                'queue_limit': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected
+            }
+    
+    def _run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        
+        with self._lock:
+            if self.pending >= self._workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.pending += 1
+        
+        # 任务结束（算完或被取消）时才从 pending 中减去：等待超时的任务仍在占用线程，需要继续计数
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._task_done)
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()  # 仍在排队时直接取消，已经开始计算的只能等它算完
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy()
+        
+        with self._lock:
+            self.completed += 1
+        return result
+    
+    def _task_done(self, future):
+        with self._lock:
+            self.pending -= 1
+
+
+hasher = PasswordHasher()
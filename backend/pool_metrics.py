@@ -0,0 +1,149 @@
+"""数据库连接池指标
+
+连接池大小、溢出、超时、回收和 pre-ping 由 SQLALCHEMY_ENGINE_OPTIONS 配置（见 config.py）。
+这里用 MeteredQueuePool 统计每次取连接的等待时间和超时次数，用连接池事件统计借出、归还、
+新建和失效的连接数，供 /api/stats/db-pool 查看，按实际数据调整 DB_POOL_SIZE / DB_MAX_OVERFLOW。
+指标只统计当前 worker 进程。
+"""
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+# 等待超过该毫秒数的取连接计为慢等待
+SLOW_WAIT_MS = 10
+
+
+class PoolMetrics:
+    """连接池计数器"""
+    
+    def __init__(self):
+        self.pool = None
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkins = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.soft_invalidations = 0
+            self.timeouts = 0
+            self.slow_waits = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.checked_out_peak = 0
+            self.overflow_peak = 0
+    
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if seconds * 1000 >= SLOW_WAIT_MS:
+                self.slow_waits += 1
+            if timed_out:
+                self.timeouts += 1
+    
+    def record_checkout(self):
+        pool = self.pool
+        with self._lock:
+            self.checkouts += 1
+            if pool is not None:
+                self.checked_out_peak = max(self.checked_out_peak, pool.checkedout())
+                self.overflow_peak = max(self.overflow_peak, pool.overflow())
+    
+    def stats(self):
+        """当前状态和累计计数"""
+        pool = self.pool
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                'pool_size': pool.size() if pool else None,
+                'max_overflow': pool._max_overflow if pool else None,
+                'timeout': pool.timeout() if pool else None,
+                'recycle': pool._recycle if pool else None,
+                'pre_ping': pool._pre_ping if pool else None,
+                'checked_out': pool.checkedout() if pool else 0,
+                'idle': pool.checkedin() if pool else 0,
+                'overflow': max(pool.overflow(), 0) if pool else 0,
+                'checked_out_peak': self.checked_out_peak,
+                'overflow_peak': max(self.overflow_peak, 0),
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'soft_invalidations': self.soft_invalidations,
+                'timeouts': self.timeouts,
+                'slow_waits': self.slow_waits,
+                'slow_wait_threshold_ms': SLOW_WAIT_MS,
+                'wait_avg_ms': round(self.wait_total / waits * 1000, 3) if waits else 0,
+                'wait_max_ms': round(self.wait_max * 1000, 3)
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    """统计取连接耗时（含排队等待和新建连接）的 QueuePool"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # engine.dispose() 会重建连接池，指标始终指向最新的实例
+        pool_metrics.pool = self
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+
+@event.listens_for(MeteredQueuePool, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    with pool_metrics._lock:
+        pool_metrics.connects += 1
+
+
+@event.listens_for(MeteredQueuePool, 'checkout')
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.record_checkout()
+
+
+@event.listens_for(MeteredQueuePool, 'checkin')
+def _on_checkin(dbapi_connection, connection_record):
+    with pool_metrics._lock:
+        pool_metrics.checkins += 1
+
+
+@event.listens_for(MeteredQueuePool, 'invalidate')
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    # pre-ping 发现断开的连接、MySQL wait_timeout 后的失效连接都会走到这里
+    with pool_metrics._lock:
+        pool_metrics.invalidations += 1
+
+
+@event.listens_for(MeteredQueuePool, 'soft_invalidate')
+def _on_soft_invalidate(dbapi_connection, connection_record, exception):
+    with pool_metrics._lock:
+        pool_metrics.soft_invalidations += 1
+
+
+def init_pool_metrics(app):
+    """在 db.init_app 之前调用：使用带统计的连接池（SQLite 内存库保持 Flask-SQLAlchemy 的默认连接池）"""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/') in ('sqlite:', 'sqlite://')):
+        # 内存库使用 StaticPool，不接受连接池大小相关参数
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            key: value for key, value in app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).items()
+            if key not in ('pool_size', 'max_overflow', 'pool_timeout')
+        }
+        return
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}), poolclass=MeteredQueuePool
+    )
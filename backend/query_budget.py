@@ -0,0 +1,46 @@
+"""接口 SQL 查询预算
+
+通过 SQLAlchemy 的 before_cursor_execute 事件统计每个请求实际执行的语句数，
+用 @query_budget(n) 声明接口允许的上限。超出时记录警告；
+QUERY_BUDGET_STRICT 开启时直接抛出异常，便于在测试环境中发现新增的懒加载。
+"""
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(Exception):
+    """请求执行的 SQL 数量超出接口预算"""
+
+
+def query_budget(limit):
+    """声明接口单次请求允许执行的 SQL 语句数（与分页大小无关）
+
+    需要登录的接口要为令牌版本校验预留 1 条（缓存过期时才会查询）。
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def init_query_budget(app):
+    """注册请求结束时的预算校验"""
+
+    @app.after_request
+    def check_query_budget(response):
+        view = app.view_functions.get(request.endpoint)
+        limit = getattr(view, 'query_budget', None)
+        count = g.get('query_count', 0)
+        if limit is not None and count > limit:
+            message = f'{request.endpoint} 执行了 {count} 条 SQL，超出预算 {limit} 条'
+            if app.config.get('QUERY_BUDGET_STRICT'):
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+        return response
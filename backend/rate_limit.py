@@ -0,0 +1,256 @@
+"""限流与过载保护
+
+令牌桶限流：登录、注册按来源 IP 和用户名各一个桶，修改密码、兑换、上传按登录用户一个桶。
+限额写作 "次数/周期"（如 "10/minute"）：桶容量为次数，按周期匀速补充；超出时返回 429 和 Retry-After。
+桶默认保存在进程内（每个 worker 各自计数）；多进程部署时设置 RATE_LIMIT_STORAGE_URL=redis://... 共享计数
+（需 pip install redis），Redis 不可用时放行并记录警告。
+
+过载保护：单个进程正在处理的请求超过 MAX_IN_FLIGHT_REQUESTS 时，新请求直接返回 503 和 Retry-After，
+不再排队等待（ASGI 模式在 asgi.py 中同样检查）。
+"""
+import logging
+import math
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+
+try:
+    import redis
+except ImportError:  # 未安装 redis 时只能使用进程内存储
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+# 过载时仍然放行的接口（监控抓取不能被挡住）
+SHED_EXEMPT_ENDPOINTS = {'get_metrics'}
+
+
+class RateLimited(Exception):
+    """超出限额"""
+    
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+def parse_limit(value):
+    """"10/minute" -> (每秒补充数, 桶容量)；空值或 0 表示不限"""
+    if not value:
+        return None
+    count, _, period = value.partition('/')
+    count = int(count)
+    if count <= 0:
+        return None
+    return count / PERIODS[period.strip() or 'second'], count
+
+
+class MemoryBucketStore:
+    """进程内令牌桶"""
+    
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def take(self, key, rate, burst):
+        """取一个令牌，返回 (是否放行, 需等待秒数)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, wait = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, wait = False, (1 - tokens) / rate
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, wait
+    
+    def _prune(self, now):
+        # 超过一天未用的桶早已补满，与不存在等价；仍然过多时整体清空（最多放过一轮突发）
+        for key in [key for key, (_, updated) in self._buckets.items() if now - updated > 86400]:
+            del self._buckets[key]
+        if len(self._buckets) > self.max_keys:
+            self._buckets.clear()
+
+
+_REDIS_TAKE = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisBucketStore:
+    """Redis 令牌桶，多个进程/服务器共享计数（用 Lua 脚本保证原子性，时间取 Redis 服务器时间）"""
+    
+    def __init__(self, url, prefix='numbmall:ratelimit:'):
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_STORAGE_URL 使用 Redis 需要先安装 redis: pip install redis')
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._take = self._client.register_script(_REDIS_TAKE)
+    
+    def take(self, key, rate, burst):
+        try:
+            allowed, wait = self._take(keys=[self.prefix + key], args=[rate, burst])
+        except redis.RedisError as e:
+            logger.warning('限流存储不可用，本次放行: %s', e)
+            return True, 0.0
+        return bool(allowed), float(wait)
+
+
+def create_store(url):
+    if not url or url.startswith('memory://'):
+        return MemoryBucketStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBucketStore(url)
+    raise RuntimeError(f'不支持的 RATE_LIMIT_STORAGE_URL: {url}')
+
+
+class AdmissionGate:
+    """限制同时处理的请求数，超出时拒绝而不是排队"""
+    
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.in_flight = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+    
+    def try_enter(self):
+        with self._lock:
+            if self.limit and self.in_flight >= self.limit:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            return True
+    
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class RateLimiter:
+    """按配置项限流，统计各限额的拒绝次数"""
+    
+    def __init__(self):
+        self.store = MemoryBucketStore()
+        self.gate = AdmissionGate()
+        self.enabled = False
+        self.rejected = {}
+        self._limits = {}
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        self.enabled = app.config['RATE_LIMIT_ENABLED']
+        self.store = create_store(app.config['RATE_LIMIT_STORAGE_URL'])
+        self.gate.limit = app.config['MAX_IN_FLIGHT_REQUESTS']
+        
+        @app.before_request
+        def admit_request():
+            if request.endpoint in SHED_EXEMPT_ENDPOINTS:
+                return None
+            if not self.gate.try_enter():
+                return overloaded_response()
+            g.admitted = True
+        
+        @app.teardown_request
+        def release_request(exception=None):
+            if g.pop('admitted', False):
+                self.gate.leave()
+    
+    def check(self, setting, key):
+        """按配置项 setting 的限额消耗 key 的一个令牌，超出时抛出 RateLimited"""
+        if not self.enabled or key is None:
+            return
+        limit = self._limit(setting)
+        if limit is None:
+            return
+        allowed, wait = self.store.take(f'{setting}:{key}', *limit)
+        if not allowed:
+            with self._lock:
+                self.rejected[setting] = self.rejected.get(setting, 0) + 1
+            raise RateLimited(max(math.ceil(wait), 1))
+    
+    def _limit(self, setting):
+        value = current_app.config.get(setting)
+        if setting not in self._limits or self._limits[setting][0] != value:
+            self._limits[setting] = (value, parse_limit(value))
+        return self._limits[setting][1]
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'storage': type(self.store).__name__,
+                'rejected': dict(self.rejected),
+                'in_flight': self.gate.in_flight,
+                'max_in_flight': self.gate.limit,
+                'shed': self.gate.shed
+            }
+
+
+limiter = RateLimiter()
+
+
+def overloaded_response():
+    response = jsonify({'code': 503, 'message': '服务繁忙，请稍后重试'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+# ==================== 限流维度 ====================
+
+def client_ip():
+    """来源 IP；部署在 Nginx 之后时开启 RATE_LIMIT_TRUST_PROXY，取 X-Real-IP / X-Forwarded-For 最后一跳"""
+    if current_app.config['RATE_LIMIT_TRUST_PROXY']:
+        forwarded = request.headers.get('X-Real-IP') or request.headers.get('X-Forwarded-For', '').split(',')[-1]
+        if forwarded.strip():
+            return forwarded.strip()
+    return request.remote_addr
+
+
+def posted_username():
+    data = request.get_json(silent=True)
+    username = data.get('username') if isinstance(data, dict) else None
+    return username.strip().lower() if isinstance(username, str) and username.strip() else None
+
+
+def current_user_id():
+    return get_jwt_identity()
+
+
+def rate_limit(setting, key):
+    """按配置项 setting 的限额限流，key 为返回限流维度（IP、用户名、用户 ID）的函数
+    
+    按登录用户限流时放在 @jwt_required() 之下。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter.check(setting, key())
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
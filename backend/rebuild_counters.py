@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""根据大拇哥记录和兑换记录重建用户统计计数"""
+
+from sqlalchemy import func, select, update
+from app import app, db, User, ThumbsRecord, ExchangeRecord
+
+
+def rebuild_user_counters():
+    """用一条 UPDATE + 关联子查询重算所有用户的 single_thumbs / double_thumbs / total_exchanges"""
+    def thumbs_count(thumb_type):
+        return select(func.count(ThumbsRecord.id)).where(
+            ThumbsRecord.user_id == User.id,
+            ThumbsRecord.thumb_type == thumb_type
+        ).scalar_subquery()
+    
+    exchanges_count = select(func.count(ExchangeRecord.id)).where(
+        ExchangeRecord.user_id == User.id,
+        ExchangeRecord.status == 'completed'
+    ).scalar_subquery()
+    
+    result = db.session.execute(
+        update(User).values(
+            single_thumbs=thumbs_count('single'),
+            double_thumbs=thumbs_count('double'),
+            total_exchanges=exchanges_count
+        ).execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+if __name__ == '__main__':
+    print("=" * 50)
+    print("重建用户统计计数")
+    print("=" * 50)
+    
+    try:
+        with app.app_context():
+            count = rebuild_user_counters()
+        print(f"\n[√] 完成！已重建 {count} 个用户的统计计数")
+    except Exception as e:
+        print(f"\n[×] 错误: {e}")
+        print("\n请确保：")
+        print("1. 数据库连接配置正确")
+        print("2. 已执行 database/upgrade.sql 添加统计计数字段")
@@ -0,0 +1,135 @@
+"""读写分离
+
+配置 DATABASE_REPLICA_URLS（逗号分隔）后，GET 请求中的查询随机发往某个只读副本，其余请求、
+flush 和 INSERT/UPDATE/DELETE 语句始终发往主库；脚本等非请求上下文也只用主库。
+
+读己之写：请求中有写操作时，该用户在 REPLICA_PIN_SECONDS 秒内的读请求也走主库，避免刚兑换完
+因为复制延迟看到旧余额。固定信息同时记在本进程（按用户 ID）和响应 Cookie 中，
+请求被分到其他 worker 时靠 Cookie 识别。
+"""
+import random
+import time
+import threading
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND_PREFIX = 'replica_'
+PIN_COOKIE = 'db_primary_until'
+
+_pinned_users = {}
+_pinned_users_lock = threading.Lock()
+
+
+def replica_binds(urls):
+    """由副本连接串生成 SQLALCHEMY_BINDS 配置
+    
+    副本显式使用普通 QueuePool，连接池指标（pool_metrics）只统计主库。
+    """
+    urls = [url.strip() for url in urls.split(',') if url.strip()]
+    return {
+        f'{REPLICA_BIND_PREFIX}{index}': {'url': url, 'poolclass': QueuePool}
+        for index, url in enumerate(urls)
+    }
+
+
+def _current_identity():
+    # 令牌尚未校验（或接口不需要登录）时没有身份
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _pinned_to_primary():
+    try:
+        if float(request.cookies.get(PIN_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    user_id = _current_identity()
+    if user_id is None:
+        return False
+    with _pinned_users_lock:
+        return _pinned_users.get(user_id, 0) > time.monotonic()
+
+
+class RoutingSession(Session):
+    """按请求类型在主库和只读副本之间选择连接"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase) and _use_replica():
+            replicas = [
+                engine for key, engine in self._db.engines.items()
+                if key and key.startswith(REPLICA_BIND_PREFIX)
+            ]
+            if replicas:
+                return random.choice(replicas)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_from_primary(view):
+    """接口的查询始终走主库
+    
+    用于结果会留在进程内缓存里的接口（商品目录、仪表板统计、排行榜）：
+    这些缓存在写接口提交后原地更新或失效，若从有延迟的副本加载，旧数据会一直留在缓存中。
+    与 @query_budget 一样放在 @app.route 和登录校验装饰器之间。
+    """
+    view.read_from_primary = True
+    return view
+
+
+def _use_replica():
+    if not has_request_context() or request.method != 'GET' or g.get('db_wrote'):
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    if getattr(view, 'read_from_primary', False):
+        return False
+    return not _pinned_to_primary()
+
+
+def _mark_write():
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _on_flush(session, flush_context):
+    _mark_write()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _on_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write()
+
+
+def init_replicas(app):
+    """在 db.init_app 之前调用：注册副本连接和读己之写处理（未配置副本时不做任何事）"""
+    urls = app.config.get('DATABASE_REPLICA_URLS')
+    if not urls:
+        return
+    app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {}, **replica_binds(urls))
+    
+    @app.after_request
+    def pin_writer_to_primary(response):
+        if not g.get('db_wrote'):
+            return response
+        
+        seconds = current_app.config['REPLICA_PIN_SECONDS']
+        user_id = _current_identity()
+        if user_id is not None:
+            with _pinned_users_lock:
+                now = time.monotonic()
+                _pinned_users[user_id] = now + seconds
+                # 顺带清理过期条目
+                for key in [key for key, until in _pinned_users.items() if until <= now]:
+                    del _pinned_users[key]
+        response.set_cookie(
+            PIN_COOKIE, str(int(time.time() + seconds) + 1),
+            max_age=seconds + 1, httponly=True, samesite='Lax', path='/api'
+        )
+        return response
@@ -0,0 +1,51 @@
+"""关键词搜索
+
+MySQL 下使用 ngram 分词的 FULLTEXT 索引（支持中文姓名），替代无法走索引的 LIKE '%kw%'。
+短于 ngram 分词长度的关键词（如单个姓氏）无法用全文索引检索，与其他数据库（本地 SQLite 等）一样
+退回 LIKE 包含匹配，结果与原来一致。
+全文索引须在关闭 InnoDB 停用词（innodb_ft_enable_stopword=OFF）时创建，否则 ngram 会丢弃包含
+a、in、on 等停用词的分词，zhang、lin、admin 这类用户名会搜不到（见 DEPLOY.md）。
+"""
+import re
+from flask import current_app
+from sqlalchemy import case, or_
+from sqlalchemy.dialects.mysql import match
+from models import db
+
+# 布尔模式下有特殊含义的字符
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+
+def _use_fulltext():
+    return db.engine.dialect.name == 'mysql'
+
+
+def _min_fulltext_length():
+    return current_app.config['SEARCH_NGRAM_TOKEN_SIZE']
+
+
+def _match(columns, keyword):
+    # 以短语形式检索，要求分词连续出现，避免 ngram 拆词后命中无关记录
+    phrase = _BOOLEAN_OPERATORS.sub(' ', keyword).strip()
+    return match(*columns, against=f'"{phrase}"').in_boolean_mode()
+
+
+def keyword_condition(columns, keyword):
+    """生成关键词过滤条件，任一列命中即可"""
+    if _use_fulltext() and len(keyword) >= _min_fulltext_length():
+        return _match(columns, keyword)
+    return or_(*[column.contains(keyword, autoescape=True) for column in columns])
+
+
+def ranked_search(query, columns, keyword, limit):
+    """按相关度取前 limit 条：完全匹配 > 前缀匹配 > 全文相关度"""
+    rank = case(
+        *[(column == keyword, 0) for column in columns],
+        *[(column.startswith(keyword, autoescape=True), 1) for column in columns],
+        else_=2
+    )
+    order_by = [rank]
+    if _use_fulltext() and len(keyword) >= _min_fulltext_length():
+        order_by.append(_match(columns, keyword).desc())
+    
+    return query.filter(keyword_condition(columns, keyword)).order_by(*order_by).limit(limit).all()
@@ -0,0 +1,29 @@
+"""列表序列化
+
+记录列表接口先收集一页记录引用的全部用户 ID，用一次 IN 查询取回姓名，
+再组装响应，避免 to_dict 对每条记录懒加载 user / giver。
+"""
+from models import db, User
+
+
+def load_user_names(user_ids):
+    """批量查询用户姓名，返回 {user_id: real_name}"""
+    ids = {user_id for user_id in user_ids if user_id}
+    if not ids:
+        return {}
+    rows = db.session.query(User.id, User.real_name).filter(User.id.in_(ids)).all()
+    return {user_id: real_name for user_id, real_name in rows}
+
+
+def serialize_thumbs_records(records):
+    """序列化一页大拇哥记录（接收人和发放人一起预取）"""
+    user_names = load_user_names(
+        [record.user_id for record in records] + [record.given_by for record in records]
+    )
+    return [record.to_dict(user_names=user_names) for record in records]
+
+
+def serialize_exchange_records(records):
+    """序列化一页兑换记录"""
+    user_names = load_user_names(record.user_id for record in records)
+    return [record.to_dict(user_names=user_names) for record in records]
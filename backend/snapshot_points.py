@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+积分快照脚本
+建议每天定时执行一次（如 crontab: 0 3 * * * cd backend && python snapshot_points.py），
+为有新积分流水的用户生成余额快照（只包含 10 分钟前写入的流水，更新的留到下次），并清理过期的幂等键。
+
+首次启用积分流水时执行 --open，把现有余额写为期初流水（上线后才执行也可以，期初为当前余额减去已有流水）:
+    python snapshot_points.py --open
+发现 users 表积分与流水不一致时，可用流水重算:
+    python snapshot_points.py --rebuild-balances
+"""
+
+import argparse
+from app import app
+import idempotency
+import ledger
+
+
+def main():
+    parser = argparse.ArgumentParser(description='积分快照')
+    parser.add_argument('--open', action='store_true', help='为还没有期初流水的用户写入期初余额（当前余额减去已有流水）')
+    parser.add_argument('--rebuild-balances', action='store_true', help='用快照和流水重算 users 表上的积分')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        if args.open:
+            count = ledger.open_balances()
+            print(f"[√] 已写入 {count} 条期初余额流水")
+        
+        count = ledger.take_snapshots()
+        print(f"[√] 已生成 {count} 个用户的积分快照")
+        
+        if args.rebuild_balances:
+            count = ledger.rebuild_balances()
+            print(f"[√] 已重算 {count} 个用户的积分")
+        
+        count = idempotency.purge_expired()
+        print(f"[√] 已清理 {count} 个过期的幂等键")
+
+
+if __name__ == '__main__':
+    print("=" * 50)
+    print("积分快照")
+    print("=" * 50)
+    
+    try:
+        main()
+    except Exception as e:
+        print(f"\n[×] 错误: {e}")
+        print("\n请确保：")
+        print("1. 数据库连接配置正确")
+        print("2. 已执行 database/upgrade.sql 创建积分流水表和幂等键表")
@@ -0,0 +1,123 @@
+"""SQL 性能分析
+
+挂在 SQLAlchemy 的 before/after_cursor_execute 事件上，对每条语句计时：
+- 超过 SLOW_QUERY_MS 的语句记录警告日志：耗时、发起的接口、SQL 文本，参数只记录类型不记录值
+- 请求带 X-Debug-SQL: 1 且令牌为管理员时，响应附带本次请求执行的语句列表和数据库总耗时
+  （JSON 响应写入 debug_sql 字段，其他响应只加 X-Debug-SQL-Count / X-Debug-SQL-Time-Ms 头），
+  用来定位 N+1 查询和全表扫描；SQL_DEBUG_ENABLED=false 时关闭
+每个请求的 SQL 累计耗时记在 g.query_seconds，供 metrics.py 使用。
+"""
+import logging
+import re
+import time
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DEBUG_HEADER = 'X-Debug-SQL'
+# 没有应用上下文时（ASGI 异步接口）使用的慢查询阈值
+DEFAULT_SLOW_QUERY_MS = 200
+_whitespace = re.compile(r'\s+')
+
+
+def redact(parameters, executemany=False):
+    """把绑定参数替换成类型名，日志中不出现手机号、密码哈希等具体值"""
+    if executemany:
+        return f'<{len(parameters)} 组参数>'
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _statement_text(statement, limit):
+    text = _whitespace.sub(' ', statement).strip()
+    return text if len(text) <= limit else text[:limit] + '...'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._sql_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_sql_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    in_request = has_request_context()
+    if in_request:
+        g.query_seconds = g.get('query_seconds', 0.0) + elapsed
+        if g.get('sql_debug') is not None:
+            _record_debug(statement, elapsed, executemany)
+    
+    threshold = current_app.config['SLOW_QUERY_MS'] if has_app_context() else DEFAULT_SLOW_QUERY_MS
+    if threshold and elapsed * 1000 >= threshold:
+        logger.warning(
+            '慢查询 %.1fms [%s] %s 参数=%s',
+            elapsed * 1000,
+            request.endpoint if in_request else '-',
+            _statement_text(statement, 2000),
+            redact(parameters, executemany)
+        )
+
+
+def _record_debug(statement, elapsed, executemany):
+    debug = g.sql_debug
+    debug['count'] += 1
+    debug['total'] += elapsed
+    if len(debug['queries']) < current_app.config['SQL_DEBUG_MAX_STATEMENTS']:
+        debug['queries'].append({
+            'sql': _statement_text(statement, 2000),
+            'ms': round(elapsed * 1000, 3),
+            'executemany': executemany
+        })
+
+
+def _is_admin():
+    """只看令牌中的角色声明，不额外查库；令牌无效时视为非管理员"""
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt().get('role') == 'admin'
+    except Exception:
+        return False
+
+
+def init_sql_profiler(app):
+    """注册 X-Debug-SQL 处理；需在 init_query_budget 之前调用，
+    使补充校验令牌产生的查询不计入接口的查询预算"""
+    
+    @app.before_request
+    def start_sql_debug():
+        if app.config['SQL_DEBUG_ENABLED'] and request.headers.get(DEBUG_HEADER, '').lower() in ('1', 'true'):
+            g.sql_debug = {'count': 0, 'total': 0.0, 'queries': []}
+    
+    @app.after_request
+    def attach_sql_debug(response):
+        debug = g.pop('sql_debug', None)
+        if debug is None or not _is_admin():
+            return response
+        
+        total_ms = round(debug['total'] * 1000, 3)
+        response.headers['X-Debug-SQL-Count'] = str(debug['count'])
+        response.headers['X-Debug-SQL-Time-Ms'] = str(total_ms)
+        # 调试响应的内容与缓存版本不同，不能带 ETag
+        response.headers.pop('ETag', None)
+        response.headers['Cache-Control'] = 'no-store'
+        if response.is_json and not response.is_streamed:
+            data = response.get_json(silent=True)
+            if isinstance(data, dict):
+                data['debug_sql'] = {
+                    'count': debug['count'],
+                    'total_ms': total_ms,
+                    'truncated': debug['count'] > len(debug['queries']),
+                    'queries': debug['queries']
+                }
+                response.set_data(app.json.dumps(data))
+        return response
@@ -0,0 +1,189 @@
+"""商品图片上传处理
+
+上传内容边写临时文件边计算 SHA-256，以内容哈希命名，同一张图片只保存一份；
+保存后生成固定尺寸的 WebP 缩略图（<hash>_200.webp、<hash>_600.webp），列表页直接加载缩略图。
+缩略图依赖 Pillow，未安装时只保存原图。
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # 未安装 Pillow 时不生成缩略图
+    Image = None
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
+UPLOAD_URL_PREFIX = '/api/uploads/'
+
+# 缩略图边长（像素）
+VARIANT_SIZES = (200, 600)
+
+CHUNK_SIZE = 64 * 1024
+
+_CONTENT_NAME = re.compile(r'^([0-9a-f]{64})\.\w+$')
+# 内容哈希命名（含缩略图）及旧版 uuid4 命名的文件写入后不会再变化
+_IMMUTABLE_NAME = re.compile(r'^([0-9a-f]{64}|[0-9a-f]{32})(_\d+)?\.\w+$')
+_variant_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-variants')
+_existing_variants = set()
+
+logger = logging.getLogger(__name__)
+
+
+class ImageTooLarge(Exception):
+    """图片像素数超过上限（可能是解压炸弹）"""
+
+
+def staging_folder():
+    """临时文件目录：与 UPLOAD_FOLDER 同级（同一文件系统，os.replace 仍是原子的），
+    不在 /api/uploads/ 能访问的范围内，写了一半的文件不会被下载"""
+    folder = UPLOAD_FOLDER.rstrip(os.sep) + '.staging'
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def save_upload(file, ext):
+    """流式保存上传文件，返回 (文件名, 是否为新文件)"""
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=staging_folder(), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+        
+        filename = f'{digest.hexdigest()}.{ext}'
+        target = os.path.join(UPLOAD_FOLDER, filename)
+        if os.path.exists(target):
+            os.remove(tmp_path)
+            return filename, False
+        
+        os.replace(tmp_path, target)
+        return filename, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def check_image_size(filename, max_pixels):
+    """只读取图片头校验尺寸，像素数超过 max_pixels 时删除文件并抛出 ImageTooLarge
+
+    声明了超大尺寸的小文件（解压炸弹）解码时会占满内存，必须在生成缩略图之前拒绝；
+    无法识别的文件与生成缩略图时一样只保留原图。
+    """
+    if Image is None:
+        return
+    path = os.path.join(UPLOAD_FOLDER, filename)
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+        too_large = width * height > max_pixels
+    except Image.DecompressionBombError:
+        too_large = True
+    except OSError:
+        return
+    if too_large:
+        os.remove(path)
+        raise ImageTooLarge()
+
+
+def variant_filename(filename, size):
+    """缩略图文件名"""
+    return f"{filename.rsplit('.', 1)[0]}_{size}.webp"
+
+
+def generate_variants(filename, background=False):
+    """生成各尺寸缩略图，已存在的跳过；background 为真时交给后台线程"""
+    if Image is None:
+        return
+    if background:
+        _variant_executor.submit(_generate_variants, filename)
+    else:
+        _generate_variants(filename)
+
+
+def _generate_variants(filename):
+    try:
+        _write_variants(filename)
+    except (OSError, Image.DecompressionBombError):
+        # 无法识别或尺寸异常的图片只保留原图
+        logger.exception('生成缩略图失败: %s', filename)
+
+
+def _write_variants(filename):
+    with Image.open(os.path.join(UPLOAD_FOLDER, filename)) as image:
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for size in VARIANT_SIZES:
+            target = os.path.join(UPLOAD_FOLDER, variant_filename(filename, size))
+            if os.path.exists(target):
+                continue
+            variant = image.copy()
+            variant.thumbnail((size, size))
+            fd, tmp_path = tempfile.mkstemp(dir=staging_folder(), suffix='.part')
+            os.close(fd)
+            try:
+                variant.save(tmp_path, 'WEBP', quality=80)
+                os.replace(tmp_path, target)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+
+def variant_urls(image_url):
+    """返回已生成缩略图的 URL，如 {'200': '/api/uploads/<hash>_200.webp'}；非内容哈希命名的旧图片返回空字典"""
+    if not image_url or not image_url.startswith(UPLOAD_URL_PREFIX):
+        return {}
+    filename = image_url[len(UPLOAD_URL_PREFIX):]
+    if not _CONTENT_NAME.match(filename):
+        return {}
+    
+    urls = {}
+    for size in VARIANT_SIZES:
+        name = variant_filename(filename, size)
+        # 文件按内容命名、不会变化，确认存在后记住，避免每次序列化都访问文件系统
+        if name not in _existing_variants:
+            if not os.path.exists(os.path.join(UPLOAD_FOLDER, name)):
+                continue
+            _existing_variants.add(name)
+        urls[str(size)] = UPLOAD_URL_PREFIX + name
+    return urls
+
+
+# 不可变文件的 (ETag, 修改时间, 大小)，命中后无需再访问文件系统
+_stat_cache = {}
+_STAT_CACHE_LIMIT = 10000
+
+
+def is_immutable(filename):
+    """文件名是否为内容哈希或 uuid 命名（内容不会变化，可长期缓存）"""
+    return _IMMUTABLE_NAME.match(filename) is not None
+
+
+def stat_upload(path, filename):
+    """返回 (etag, last_modified, size)，文件不存在返回 None
+
+    不可变文件以文件名主体作为 ETag 并缓存结果；其他文件每次读取 stat。
+    """
+    entry = _stat_cache.get(filename)
+    if entry is not None:
+        return entry
+    
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    
+    if is_immutable(filename):
+        entry = (filename.rsplit('.', 1)[0], st.st_mtime, st.st_size)
+        if len(_stat_cache) >= _STAT_CACHE_LIMIT:
+            _stat_cache.clear()
+        _stat_cache[filename] = entry
+        return entry
+    return (f'{int(st.st_mtime)}-{st.st_size}', st.st_mtime, st.st_size)
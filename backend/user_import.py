@@ -0,0 +1,192 @@
+"""批量导入 / 同步用户名单
+
+HR 名单（CSV 或 JSON）一次性校验：文件内重复和必填字段在内存中检查，已有用户按用户名分批 IN 查询取回，
+不再逐个 SELECT；新用户的初始密码交给哈希线程池并行计算，再按 chunk_size 条一组多行 INSERT。
+同步模式下更新已有用户的姓名/邮箱/电话，并可停用名单中不存在的普通用户。dry_run 只返回差异报告。
+"""
+import csv
+import io
+import json
+from sqlalchemy import insert, update
+from models import db, User
+from passwords import hasher
+from auth import forget_token_versions
+
+ROSTER_FIELDS = ('username', 'real_name', 'email', 'phone', 'role', 'password')
+SYNC_FIELDS = ('real_name', 'email', 'phone')
+FIELD_LIMITS = {'username': 50, 'real_name': 50, 'email': 100, 'phone': 20}
+
+
+class RosterError(ValueError):
+    """名单文件无法解析"""
+
+
+def parse_roster(content, fmt):
+    """解析名单，fmt 为 csv 或 json（content 也可以是已解析的 JSON 数组）；返回 [(行号, {字段: 值})]"""
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise RosterError('名单文件需为 UTF-8 编码')
+    
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(content))
+        if not reader.fieldnames or 'username' not in reader.fieldnames:
+            raise RosterError('CSV 缺少表头或 username 列')
+        rows = [(reader.line_num, row) for row in reader]
+    elif fmt == 'json':
+        try:
+            data = json.loads(content) if isinstance(content, str) else content
+        except ValueError:
+            raise RosterError('JSON 格式错误')
+        if isinstance(data, dict):
+            data = data.get('users')
+        if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+            raise RosterError('JSON 需为用户对象数组或 {"users": [...]}')
+        rows = list(enumerate(data, start=1))
+    else:
+        raise RosterError('名单格式只支持 csv 或 json')
+    
+    return [(line, _clean(row)) for line, row in rows]
+
+
+def _clean(row):
+    cleaned = {}
+    for field in ROSTER_FIELDS:
+        value = row.get(field)
+        value = str(value).strip() if value is not None else ''
+        cleaned[field] = value or None
+    return cleaned
+
+
+def _validate(row):
+    if not row['username'] or not row['real_name']:
+        return '用户名和姓名不能为空'
+    for field, limit in FIELD_LIMITS.items():
+        if row[field] and len(row[field]) > limit:
+            return f'{field} 超过 {limit} 个字符'
+    if row['role'] not in (None, 'admin', 'user'):
+        return '角色只能是 admin 或 user'
+    return None
+
+
+def username_key(username):
+    """比较用户名时使用的键：MySQL 的 utf8mb4_*_ci 排序规则不区分大小写，Alice 与 alice 是同一个用户"""
+    return username.casefold()
+
+
+def load_users_by_username(usernames, chunk_size=1000):
+    """按用户名分批 IN 查询已有用户，返回 {username_key(username): row}"""
+    usernames = list(usernames)
+    existing = {}
+    for start in range(0, len(usernames), chunk_size):
+        rows = db.session.query(
+            User.id, User.username, User.real_name, User.email, User.phone, User.is_active
+        ).filter(User.username.in_(usernames[start:start + chunk_size])).all()
+        existing.update((username_key(row.username), row) for row in rows)
+    return existing
+
+
+def plan_import(rows, sync=False, deactivate_missing=False, default_password=None):
+    """对比名单与数据库，生成导入计划；任何一行有错误时整份名单都不应写入"""
+    errors = []
+    valid = {}
+    for line, row in rows:
+        message = _validate(row)
+        if not message and username_key(row['username']) in valid:
+            message = '用户名在名单中重复'
+        if message:
+            errors.append({'line': line, 'username': row['username'], 'message': message})
+        else:
+            valid[username_key(row['username'])] = (line, row)
+    
+    existing = load_users_by_username(row['username'] for _, row in valid.values())
+    
+    plan = {'create': [], 'update': [], 'deactivate': [], 'unchanged': 0, 'errors': errors}
+    for key, (line, row) in valid.items():
+        username = row['username']
+        user = existing.get(key)
+        if user is None:
+            password = row['password'] or default_password
+            if not password:
+                errors.append({'line': line, 'username': username, 'message': '缺少初始密码'})
+                continue
+            plan['create'].append(dict(row, password=password, role=row['role'] or 'user'))
+        elif not sync:
+            errors.append({'line': line, 'username': username, 'message': '用户名已存在'})
+        else:
+            changes = {
+                field: row[field] for field in SYNC_FIELDS
+                if row[field] is not None and row[field] != getattr(user, field)
+            }
+            if not user.is_active:
+                changes['is_active'] = True
+            if changes:
+                plan['update'].append({'id': user.id, 'username': username, 'changes': changes})
+            else:
+                plan['unchanged'] += 1
+    
+    if sync and deactivate_missing:
+        # 名单中出现过的用户名（包括校验失败的行）都不停用
+        listed = {username_key(row['username']) for _, row in rows if row['username']}
+        active_users = db.session.query(User.id, User.username).filter(
+            User.role == 'user', User.is_active.is_(True)
+        ).all()
+        plan['deactivate'] = [
+            {'id': user_id, 'username': username}
+            for user_id, username in active_users if username_key(username) not in listed
+        ]
+    
+    return plan
+
+
+def import_report(plan, dry_run):
+    """差异报告（不含密码）"""
+    return {
+        'dry_run': dry_run,
+        'created': [row['username'] for row in plan['create']],
+        'updated': [{'username': item['username'], 'changes': item['changes']} for item in plan['update']],
+        'deactivated': [item['username'] for item in plan['deactivate']],
+        'unchanged_count': plan['unchanged'],
+        'errors': plan['errors']
+    }
+
+
+def apply_import(plan, chunk_size=500):
+    """执行导入计划并提交，返回新建的普通用户数"""
+    hashes = hasher.hash_many(row['password'] for row in plan['create'])
+    new_users = [
+        {
+            'username': row['username'],
+            'password': password_hash,
+            'real_name': row['real_name'],
+            'email': row['email'],
+            'phone': row['phone'],
+            'role': row['role']
+        }
+        for row, password_hash in zip(plan['create'], hashes)
+    ]
+    for start in range(0, len(new_users), chunk_size):
+        db.session.execute(insert(User), new_users[start:start + chunk_size])
+    
+    # 按主键批量更新，同一组变更字段合并为一次 executemany（只合并相邻的行，先按字段组合排序）
+    updates = sorted(
+        (dict(item['changes'], id=item['id']) for item in plan['update']),
+        key=lambda row: sorted(row)
+    )
+    for start in range(0, len(updates), chunk_size):
+        db.session.execute(update(User), updates[start:start + chunk_size])
+    
+    # 停用同时令牌版本加一，已登录的会话随之失效
+    deactivate_ids = [item['id'] for item in plan['deactivate']]
+    for start in range(0, len(deactivate_ids), chunk_size):
+        db.session.execute(
+            update(User)
+            .where(User.id.in_(deactivate_ids[start:start + chunk_size]))
+            .values(is_active=False, token_version=User.token_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+    
+    db.session.commit()
+    forget_token_versions(deactivate_ids)
+    return sum(1 for row in new_users if row['role'] == 'user')
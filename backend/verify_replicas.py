@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+读写分离验证脚本
+用两个临时 SQLite 文件分别充当主库和只读副本：建好主库后复制一份作为副本，此后副本不再同步，
+相当于复制延迟无限大。依次验证：
+1. 未写过数据的用户，GET 请求读副本
+2. 写请求（兑换）只落在主库
+3. 写过数据的用户在固定窗口内读主库（同一 worker 靠进程内记录，其他 worker 靠 Cookie）
+4. 固定窗口过后重新读副本
+5. 结果会进入进程内缓存的接口始终读主库
+
+    python verify_replicas.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+PIN_SECONDS = 1
+
+
+def setup():
+    """必须在导入 app 之前设置主库和副本地址"""
+    work_dir = tempfile.mkdtemp()
+    primary = os.path.join(work_dir, 'primary.db')
+    replica = os.path.join(work_dir, 'replica.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{primary}'
+    os.environ['DATABASE_REPLICA_URLS'] = f'sqlite:///{replica}'
+    os.environ['REPLICA_PIN_SECONDS'] = str(PIN_SECONDS)
+    
+    from app import app, db, User, Product
+    with app.app_context():
+        db.create_all()
+        for username in ('reader', 'writer'):
+            user = User(username=username, real_name=username, role='user', total_points=100, available_points=100)
+            user.set_password('password')
+            db.session.add(user)
+        db.session.add(Product(name='测试商品', points_required=10, stock=5, status='on_shelf'))
+        db.session.commit()
+        db.engine.dispose()
+    shutil.copyfile(primary, replica)
+    return app
+
+
+def login(client, username):
+    response = client.post('/api/auth/login', json={'username': username, 'password': 'password'})
+    return {'Authorization': f"Bearer {response.get_json()['data']['token']}"}
+
+
+def points(client, headers):
+    return client.get('/api/auth/info', headers=headers).get_json()['data']['available_points']
+
+
+def main():
+    app = setup()
+    import replicas
+    
+    failures = 0
+    
+    def check(ok, message):
+        nonlocal failures
+        print(f"[{'√' if ok else '×'}] {message}")
+        failures += 0 if ok else 1
+    
+    client = app.test_client()
+    reader = login(client, 'reader')
+    writer = login(client, 'writer')
+    
+    response = client.post('/api/exchanges', headers=writer, json={'product_id': 1, 'quantity': 1})
+    check(response.status_code == 200, f"兑换成功（HTTP {response.status_code}）")
+    check('db_primary_until' in response.headers.get('Set-Cookie', ''), "写请求的响应带上了固定主库的 Cookie")
+    
+    with app.app_context():
+        replica = app.extensions['sqlalchemy'].engines['replica_0']
+        with replica.connect() as connection:
+            replica_points = connection.exec_driver_sql(
+                "SELECT available_points FROM users WHERE username = 'writer'"
+            ).scalar()
+    check(replica_points == 100, f"副本上的积分未变（{replica_points}），写请求没有发往副本")
+    
+    check(points(client, writer) == 90, "写入后同一用户读到主库的新积分（同一 worker）")
+    
+    other_worker = app.test_client()
+    replicas._pinned_users.clear()
+    other_worker.set_cookie('db_primary_until', client.get_cookie('db_primary_until', path='/api').value, path='/api')
+    check(points(other_worker, writer) == 90, "换一个 worker（只有 Cookie）仍读主库")
+    
+    with app.app_context():
+        with app.extensions['sqlalchemy'].engine.begin() as connection:
+            connection.exec_driver_sql("UPDATE users SET available_points = 50 WHERE username = 'reader'")
+    check(points(app.test_client(), reader) == 100, "未写过数据的用户读副本（主库已改为 50，读到副本上的 100）")
+    
+    time.sleep(PIN_SECONDS + 1.5)
+    check(points(client, writer) == 100, f"{PIN_SECONDS} 秒固定窗口过后重新读副本（副本未同步，读到旧积分）")
+    
+    stock = client.get('/api/products/1', headers=writer).get_json()['data']['stock']
+    check(stock == 4, f"商品详情（进程内缓存）始终读主库，库存 {stock}")
+    
+    print(f"\n{'全部通过' if not failures else f'{failures} 项未通过'}")
+    return failures
+
+
+if __name__ == '__main__':
+    print("=" * 50)
+    print("读写分离验证")
+    print("=" * 50)
+    
+    sys.exit(1 if main() else 0)
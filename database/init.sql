@@ -3,6 +3,11 @@ CREATE DATABASE IF NOT EXISTS thumbs_mall CHARACTER SET utf8mb4 COLLATE utf8mb4_
 
 USE thumbs_mall;
 
+-- 全文索引使用 ngram 分词，创建时须关闭 InnoDB 默认停用词表：ngram 会丢弃包含停用词（a、i、at、in、on、is 等）的分词，
+-- 开启时 zhang、lin、admin 这类拼音/英文用户名会搜不到。停用词设置在建索引时生效，生产库同时在 my.cnf 中配置
+-- innodb_ft_enable_stopword=OFF（见 DEPLOY.md），以后重建索引也不受影响
+SET SESSION innodb_ft_enable_stopword = OFF;
+
 -- 用户表
 CREATE TABLE IF NOT EXISTS users (
     id INT PRIMARY KEY AUTO_INCREMENT,
@@ -14,9 +19,17 @@ CREATE TABLE IF NOT EXISTS users (
     role ENUM('admin', 'user') DEFAULT 'user',
     total_points INT DEFAULT 0 COMMENT '总积分',
     available_points INT DEFAULT 0 COMMENT '可用积分',
+    single_thumbs INT NOT NULL DEFAULT 0 COMMENT '单大拇哥数量',
+    double_thumbs INT NOT NULL DEFAULT 0 COMMENT '双大拇哥数量',
+    total_exchanges INT NOT NULL DEFAULT 0 COMMENT '已完成兑换次数',
+    token_version INT NOT NULL DEFAULT 0 COMMENT '令牌版本，改密后加一',
+    is_active TINYINT(1) NOT NULL DEFAULT 1 COMMENT '是否启用',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    INDEX idx_username (username)
+    INDEX idx_username (username),
+    INDEX idx_users_created_id (created_at, id) COMMENT '游标分页',
+    INDEX idx_users_real_name (real_name),
+    FULLTEXT INDEX ft_users_name (username, real_name) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户表';
 
 -- 大拇哥记录表
@@ -30,8 +43,8 @@ CREATE TABLE IF NOT EXISTS thumbs_records (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (given_by) REFERENCES users(id) ON DELETE SET NULL,
-    INDEX idx_user_id (user_id),
-    INDEX idx_created_at (created_at)
+    INDEX idx_thumbs_created_id (created_at, id) COMMENT '游标分页',
+    INDEX idx_thumbs_user_created_id (user_id, created_at, id) COMMENT '按用户游标分页'
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='大拇哥记录表';
 
 -- 商品表
@@ -47,7 +60,8 @@ CREATE TABLE IF NOT EXISTS products (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_status (status),
-    INDEX idx_sort_order (sort_order)
+    INDEX idx_sort_order (sort_order),
+    FULLTEXT INDEX ft_products_name (name) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='商品表';
 
 -- 兑换记录表
@@ -64,10 +78,51 @@ CREATE TABLE IF NOT EXISTS exchange_records (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE RESTRICT,
-    INDEX idx_user_id (user_id),
-    INDEX idx_created_at (created_at)
+    INDEX idx_exchange_created_id (created_at, id) COMMENT '游标分页',
+    INDEX idx_exchange_user_created_id (user_id, created_at, id) COMMENT '按用户游标分页'
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='兑换记录表';
 
+-- 积分流水表（只追加）
+CREATE TABLE IF NOT EXISTS points_ledger (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    entry_type ENUM('opening', 'credit', 'debit', 'refund') NOT NULL COMMENT '期初/获得/兑换/退回',
+    total_delta INT NOT NULL DEFAULT 0 COMMENT '总积分变化',
+    available_delta INT NOT NULL DEFAULT 0 COMMENT '可用积分变化',
+    source_type ENUM('thumbs', 'exchange') COMMENT '来源记录类型',
+    source_id INT COMMENT '来源记录ID',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_ledger_user_id (user_id, id),
+    INDEX idx_ledger_source (source_type, source_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='积分流水表';
+
+-- 积分快照表
+CREATE TABLE IF NOT EXISTS points_snapshots (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    ledger_id INT NOT NULL COMMENT '快照包含的最后一条流水ID',
+    total_points INT NOT NULL COMMENT '总积分',
+    available_points INT NOT NULL COMMENT '可用积分',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_snapshot_user_ledger (user_id, ledger_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='积分快照表';
+
+-- 幂等键表（兑换、发放大拇哥的成功响应，按 Idempotency-Key 请求头去重）
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    idempotency_key VARCHAR(64) NOT NULL COMMENT '客户端生成的幂等键',
+    request_hash CHAR(64) NOT NULL COMMENT '请求路径和请求体的 SHA-256',
+    status_code INT COMMENT '响应状态码，为空表示正在处理',
+    response_body MEDIUMTEXT COMMENT '响应内容',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY uk_idempotency_user_key (user_id, idempotency_key),
+    INDEX idx_idempotency_created (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='幂等键表';
+
 -- 插入默认管理员账号 (密码: admin123)
 INSERT INTO users (username, password, real_name, role, total_points, available_points) VALUES
 ('admin', 'pbkdf2:sha256:260000$salt$hash', '系统管理员', 'admin', 0, 0);
@@ -91,5 +146,13 @@ INSERT INTO thumbs_records (user_id, thumb_type, points, reason, given_by) VALUE
 (2, 'single', 1, '积极参与团队活动', 1),
 (3, 'single', 1, '帮助同事解决技术问题', 1);
 
+-- 测试用户的现有积分记为期初余额流水
+INSERT INTO points_ledger (user_id, entry_type, total_delta, available_delta)
+SELECT id, 'opening', total_points, available_points FROM users
+WHERE total_points <> 0 OR available_points <> 0;
 
-
+-- 根据测试记录同步用户统计计数
+UPDATE users u SET
+    single_thumbs = (SELECT COUNT(*) FROM thumbs_records t WHERE t.user_id = u.id AND t.thumb_type = 'single'),
+    double_thumbs = (SELECT COUNT(*) FROM thumbs_records t WHERE t.user_id = u.id AND t.thumb_type = 'double'),
+    total_exchanges = (SELECT COUNT(*) FROM exchange_records e WHERE e.user_id = u.id AND e.status = 'completed');
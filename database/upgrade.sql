@@ -0,0 +1,90 @@
+-- 已有数据库升级脚本
+-- 新部署直接执行 init.sql 即可；已有库按顺序执行下面尚未应用的部分
+
+USE thumbs_mall;
+
+-- 全文索引使用 ngram 分词，创建时须关闭 InnoDB 默认停用词表：ngram 会丢弃包含停用词（a、i、at、in、on、is 等）的分词，
+-- 开启时 zhang、lin、admin 这类拼音/英文用户名会搜不到。停用词设置在建索引时生效，生产库同时在 my.cnf 中配置
+-- innodb_ft_enable_stopword=OFF（见 DEPLOY.md），以后重建索引也不受影响
+SET SESSION innodb_ft_enable_stopword = OFF;
+
+-- 游标分页复合索引 (created_at, id)
+-- 二级索引本身带主键，新索引完全覆盖原来的 idx_created_at / idx_user_id，一并删除以免增加写入开销
+ALTER TABLE users
+    ADD INDEX idx_users_created_id (created_at, id);
+ALTER TABLE thumbs_records
+    ADD INDEX idx_thumbs_created_id (created_at, id),
+    ADD INDEX idx_thumbs_user_created_id (user_id, created_at, id),
+    DROP INDEX idx_created_at,
+    DROP INDEX idx_user_id;
+ALTER TABLE exchange_records
+    ADD INDEX idx_exchange_created_id (created_at, id),
+    ADD INDEX idx_exchange_user_created_id (user_id, created_at, id),
+    DROP INDEX idx_created_at,
+    DROP INDEX idx_user_id;
+
+-- 用户统计计数（添加后执行 backend/rebuild_counters.py 回填）
+ALTER TABLE users
+    ADD COLUMN single_thumbs INT NOT NULL DEFAULT 0 COMMENT '单大拇哥数量' AFTER available_points,
+    ADD COLUMN double_thumbs INT NOT NULL DEFAULT 0 COMMENT '双大拇哥数量' AFTER single_thumbs,
+    ADD COLUMN total_exchanges INT NOT NULL DEFAULT 0 COMMENT '已完成兑换次数' AFTER double_thumbs;
+
+-- 令牌版本（修改/重置密码后旧令牌失效）
+ALTER TABLE users
+    ADD COLUMN token_version INT NOT NULL DEFAULT 0 COMMENT '令牌版本，改密后加一' AFTER total_exchanges;
+
+-- 关键词搜索：ngram 全文索引（中文按 2 字分词，对应 ngram_token_size 默认值）
+ALTER TABLE users
+    ADD INDEX idx_users_real_name (real_name),
+    ADD FULLTEXT INDEX ft_users_name (username, real_name) WITH PARSER ngram;
+ALTER TABLE products
+    ADD FULLTEXT INDEX ft_products_name (name) WITH PARSER ngram;
+-- 之前在开启停用词时已经创建过上面两个全文索引的库，执行下面两条重建（仍需先执行开头的 SET SESSION）
+-- ALTER TABLE users DROP INDEX ft_users_name, ADD FULLTEXT INDEX ft_users_name (username, real_name) WITH PARSER ngram;
+-- ALTER TABLE products DROP INDEX ft_products_name, ADD FULLTEXT INDEX ft_products_name (name) WITH PARSER ngram;
+
+-- 积分流水与快照（创建后执行 backend/snapshot_points.py --open 写入期初余额）
+-- 积分流水表（只追加）
+CREATE TABLE IF NOT EXISTS points_ledger (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    entry_type ENUM('opening', 'credit', 'debit', 'refund') NOT NULL COMMENT '期初/获得/兑换/退回',
+    total_delta INT NOT NULL DEFAULT 0 COMMENT '总积分变化',
+    available_delta INT NOT NULL DEFAULT 0 COMMENT '可用积分变化',
+    source_type ENUM('thumbs', 'exchange') COMMENT '来源记录类型',
+    source_id INT COMMENT '来源记录ID',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_ledger_user_id (user_id, id),
+    INDEX idx_ledger_source (source_type, source_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='积分流水表';
+
+-- 积分快照表
+CREATE TABLE IF NOT EXISTS points_snapshots (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    ledger_id INT NOT NULL COMMENT '快照包含的最后一条流水ID',
+    total_points INT NOT NULL COMMENT '总积分',
+    available_points INT NOT NULL COMMENT '可用积分',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_snapshot_user_ledger (user_id, ledger_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='积分快照表';
+
+-- 账号停用（名单同步时停用离职人员，停用后不能登录）
+ALTER TABLE users
+    ADD COLUMN is_active TINYINT(1) NOT NULL DEFAULT 1 COMMENT '是否启用' AFTER token_version;
+
+-- 幂等键表（兑换、发放大拇哥的成功响应，按 Idempotency-Key 请求头去重）
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    idempotency_key VARCHAR(64) NOT NULL COMMENT '客户端生成的幂等键',
+    request_hash CHAR(64) NOT NULL COMMENT '请求路径和请求体的 SHA-256',
+    status_code INT COMMENT '响应状态码，为空表示正在处理',
+    response_body MEDIUMTEXT COMMENT '响应内容',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY uk_idempotency_user_key (user_id, idempotency_key),
+    INDEX idx_idempotency_created (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='幂等键表';
@@ -7,6 +7,10 @@ const api = axios.create({
   timeout: 15000
 })
 
+// 兑换、发放大拇哥等写操作的幂等键：同一次操作重试时后端只处理一次
+export const newIdempotencyKey = () =>
+  window.crypto?.randomUUID?.() ?? `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+
 // 请求拦截器
 api.interceptors.request.use(
   config => {
@@ -37,6 +41,13 @@ api.interceptors.response.use(
   error => {
     console.error('API Error:', error)
     
+    // 带幂等键的请求在网络中断或超时时自动重试一次，后端不会重复处理
+    const config = error.config
+    if (!error.response && config?.headers?.['Idempotency-Key'] && !config._retried) {
+      config._retried = true
+      return api(config)
+    }
+    
     if (error.response) {
       switch (error.response.status) {
         case 401:
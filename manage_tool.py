@@ -11,7 +11,7 @@ import subprocess
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QTextEdit, QGroupBox, QTabWidget,
-    QLineEdit, QMessageBox, QProgressBar
+    QLineEdit, QMessageBox, QProgressBar, QFileDialog, QInputDialog
 )
 from PyQt5.QtCore import QThread, pyqtSignal, Qt
 from PyQt5.QtGui import QFont, QIcon
@@ -22,16 +22,18 @@ class WorkerThread(QThread):
     output = pyqtSignal(str)
     finished = pyqtSignal(bool)
     
-    def __init__(self, command, cwd=None):
+    def __init__(self, command, cwd=None, env=None):
         super().__init__()
-        self.command = command
+        self.command = command  # 字符串经 shell 执行；列表作为参数直接执行，不经 shell 解析
         self.cwd = cwd or os.path.dirname(__file__)
+        self.env = env
     
     def run(self):
         try:
             process = subprocess.Popen(
                 self.command,
-                shell=True,
+                shell=isinstance(self.command, str),
+                env=self.env,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 cwd=self.cwd,
@@ -164,11 +166,26 @@ class ManageTool(QMainWindow):
         btn_reset_passwords.clicked.connect(self.reset_test_passwords)
         layout.addWidget(btn_reset_passwords)
         
+        btn_rebuild_counters = QPushButton('重建用户统计计数')
+        btn_rebuild_counters.clicked.connect(self.rebuild_counters)
+        layout.addWidget(btn_rebuild_counters)
+        
+        btn_snapshot_points = QPushButton('生成积分快照')
+        btn_snapshot_points.clicked.connect(self.snapshot_points)
+        layout.addWidget(btn_snapshot_points)
+        
+        btn_import_users = QPushButton('导入用户名单')
+        btn_import_users.clicked.connect(self.import_users)
+        layout.addWidget(btn_import_users)
+        
         # 说明
         info = QLabel(
             '说明：\n'
             '• 初始化数据库：创建数据库和表，导入测试数据\n'
-            '• 重置密码：将 admin、zhangsan、lisi 的密码重置为默认值'
+            '• 重置密码：将 admin、zhangsan、lisi 的密码重置为默认值\n'
+            '• 重建统计计数：根据大拇哥和兑换记录重新计算每个用户的计数\n'
+            '• 积分快照：为有新积分流水的用户生成余额快照（建议每天执行）\n'
+            '• 导入用户名单：从 CSV/JSON 批量创建或同步用户，可先预览差异'
         )
         info.setStyleSheet('color: #666; padding: 10px; background: #f5f5f5; border-radius: 5px;')
         layout.addWidget(info)
@@ -259,16 +276,16 @@ class ManageTool(QMainWindow):
         self.output_text.append(message)
         self.output_text.ensureCursorVisible()
     
-    def run_command(self, command, description):
+    def run_command(self, command, description, cwd=None, env=None):
         """运行命令"""
         self.log(f'\n>>> {description}')
-        self.log(f'执行: {command}\n')
+        self.log(f'执行: {command if isinstance(command, str) else subprocess.list2cmdline(command)}\n')
         
         if self.worker and self.worker.isRunning():
             QMessageBox.warning(self, '警告', '有任务正在执行，请稍候')
             return
         
-        self.worker = WorkerThread(command)
+        self.worker = WorkerThread(command, cwd, env)
         self.worker.output.connect(self.log)
         self.worker.finished.connect(lambda success: self.on_task_finished(success, description))
         self.worker.start()
@@ -314,6 +331,48 @@ class ManageTool(QMainWindow):
         command = 'cd backend && python reset_admin.py'
         self.run_command(command, '重置测试用户密码')
     
+    def rebuild_counters(self):
+        """重建用户统计计数"""
+        command = 'cd backend && python rebuild_counters.py'
+        self.run_command(command, '重建用户统计计数')
+    
+    def snapshot_points(self):
+        """生成积分快照"""
+        command = 'cd backend && python snapshot_points.py'
+        self.run_command(command, '生成积分快照')
+    
+    def import_users(self):
+        """批量导入用户名单"""
+        path, _ = QFileDialog.getOpenFileName(self, '选择用户名单', '', '名单文件 (*.csv *.json)')
+        if not path:
+            return
+        
+        args = ['python', 'import_users.py', path]
+        reply = QMessageBox.question(
+            self, '导入方式',
+            '是否按名单同步？\n\n'
+            '是：更新已有用户资料，并停用名单中没有的普通用户\n'
+            '否：只新建用户，名单中已存在的用户名视为错误',
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel
+        )
+        if reply == QMessageBox.Cancel:
+            return
+        if reply == QMessageBox.Yes:
+            args += ['--sync', '--deactivate-missing']
+        
+        password, ok = QInputDialog.getText(self, '初始密码', '名单未提供密码的新用户使用的初始密码（可留空）:')
+        if not ok:
+            return
+        # 密码通过环境变量传给脚本，不拼进命令行（避免 shell 解析引号等字符，也不会显示在日志和进程列表中）
+        env = dict(os.environ, IMPORT_DEFAULT_PASSWORD=password) if password else None
+        
+        reply = QMessageBox.question(self, '导入用户', '只预览差异（不写入数据库）？', QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            args.append('--dry-run')
+        
+        backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+        self.run_command(args, '导入用户名单', cwd=backend_dir, env=env)
+    
     def start_backend(self):
         """启动后端"""
         subprocess.Popen('start cmd /k "cd backend && python app.py"', shell=True)